@@ -0,0 +1,207 @@
+from datetime import date, timedelta
+from typing import Dict, FrozenSet, Iterable, Iterator
+import argparse
+import calendar
+import hashlib
+import os
+import re
+import sys
+from name_gazetteer import NameGazetteer
+from field_patterns import name_stopwords
+
+# Mirrors PRESERVED_TERMS in text-sanitizer.js: words never treated as names
+PRESERVED_TERMS = frozenset([
+    # Medical conditions and tests
+    'CVA', 'FIM', 'MMSE', 'COPD', 'Diabetes', 'Mellitus',
+
+    # Common medical terms in Hebrew
+    'עצמאי', 'בקבלה', 'בשחרור', 'אבחנות', 'פיזיותרפיה',
+    'משקל', 'מטר', 'בציוני', 'אבח', 'יום', 'בברכה',
+
+    # Medical document terms
+    'מחלקת', 'שיקום', 'מכתב', 'שחרור', 'תאריך', 'קבלה',
+    'תיק', 'רפואי', 'לידה', 'עיקריות', 'איסכמי', 'המיספרה',
+    'שמאלית', 'לחץ', 'דם', 'סוכרת', 'מסוג', 'הערכת',
+    'מוטורי', 'טיפול', 'עצמי', 'רחצה', 'הלבשה', 'גוף',
+    'עליון', 'תחתון', 'בסוגרים', 'שתן', 'צואה',
+
+    # Medical activities and measurements
+    'העברות', 'מיטה', 'כסא', 'שירותים', 'אמבטיה', 'מקלחת',
+    'ניידות', 'מדרגות', 'קוגניטיבי', 'הבנה', 'הבעה',
+    'אינטראקציה', 'חברתית', 'פתרון', 'בעיות', 'זיכרון',
+
+    # Common words and phrases
+    'החולים', 'הכללי', 'בית', 'מספר', 'סיכום', 'מהלך',
+    'האשפוז', 'המטופל', 'התקבל', 'למחלקת', 'לאחר', 'אירוע',
+    'מוחי', 'בקבלתו', 'סבל', 'מחולשה', 'בפלג', 'קשיים',
+    'בדיבור', 'והפרעה', 'בשיווי', 'במהלך', 'עבר', 'שיקומי',
+    'אינטנסיבי', 'הכולל', 'ריפוי', 'בעיסוק', 'קלינאות',
+    'תקשורת', 'מסוגל', 'כעת', 'לבצע', 'חל', 'שיפור',
+    'משמעותי', 'בתפקוד', 'המוטורי', 'והקוגניטיבי', 'כפי',
+    'שמשתקף', 'מרבית', 'פעולות', 'היומיום', 'באופן',
+    'בעזרה', 'מינימלית', 'הליכה', 'מתבצעת', 'בעזרת',
+    'הליכון', 'לטווח', 'המלצות', 'המשך', 'במסגרת', 'מעקב',
+    'משפחה', 'תרופתי', 'פעם', 'פעמיים', 'בשבוע'
+])
+
+# Everything de-identified, as alternatives of one regex scanned once:
+# file paths, 9-digit ID numbers, dates and Hebrew tokens (name candidates)
+DEIDENTIFY_REGEX = re.compile(
+    r'(?P<path>file:///\S*|(?:[A-Za-z]:)?(?:[\\/][\w.-]+)+\.[A-Za-z]{2,5}\b)'
+    r'|(?P<id>(?<!\d)\d{9}(?!\d))'
+    r'|(?P<date>(?<!\d)(?P<day>\d{1,2})(?P<sep>[./])(?P<month>\d{1,2})(?P=sep)(?P<year>\d{4})(?!\d))'
+    r'|(?P<token>[א-ת][א-ת\'"]*)'
+)
+
+# Surnames that are always treated as names (as in text-sanitizer.js)
+NAME_SUFFIX_REGEX = re.compile(r'(?:ישראלי|כהן|לוי)$')
+
+class Deidentifier:
+    """Replace names, ID numbers and dates with stable pseudonyms in one pass.
+
+    Pseudonyms are keyed hashes of the original value, so the same person
+    or ID maps to the same pseudonym in every document processed with the
+    same key (ID_607292 for IDs, NAME_104233 for names). With shift_dates,
+    dates are shifted by a key-derived number of days, which keeps them
+    valid and keeps intervals such as the length of stay; by default they
+    are left unchanged. File paths are removed. Tokens in exclude (e.g.
+    the field labels of the extractor) are never treated as names.
+    """
+
+    def __init__(self, key: str = None, gazetteer: NameGazetteer = None,
+                 shift_dates: bool = False, exclude: FrozenSet[str] = frozenset(),
+                 cache_size: int = 100000):
+        key = key if key is not None else os.environ.get('DEID_KEY', '')
+        self.key = hashlib.blake2b(key.encode('utf-8'), digest_size=32).digest()
+        self.gazetteer = gazetteer or NameGazetteer.load()
+        self.date_shift = timedelta(days=self._number('date-shift', 1000) % 365 + 1) if shift_dates else None
+        self.exclude = exclude
+        self.cache_size = cache_size
+        self._is_name: Dict[str, bool] = {}
+        self._pseudonyms: Dict[str, str] = {}
+
+    def _number(self, value: str, modulo: int = 1000000) -> int:
+        digest = hashlib.blake2b(value.encode('utf-8'), key=self.key, digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % modulo
+
+    def pseudonym(self, kind: str, value: str) -> str:
+        """Stable pseudonym such as ID_607292 for value."""
+        cache_key = f'{kind}:{value}'
+        pseudonym = self._pseudonyms.get(cache_key)
+        if pseudonym is None:
+            if len(self._pseudonyms) >= self.cache_size:
+                self._pseudonyms.clear()
+            pseudonym = f'{kind}_{self._number(cache_key):06d}'
+            self._pseudonyms[cache_key] = pseudonym
+        return pseudonym
+
+    def is_name(self, token: str) -> bool:
+        """Whether token is treated as a name, following text-sanitizer.js.
+
+        Preserved and excluded terms and one- or two-letter tokens are kept; otherwise
+        a token is a name if the gazetteer knows it or it ends like a
+        common surname.
+        """
+        result = self._is_name.get(token)
+        if result is None:
+            if len(self._is_name) >= self.cache_size:
+                self._is_name.clear()
+            result = (
+                len(token) > 2
+                and token not in PRESERVED_TERMS
+                and token not in self.exclude
+                and (token in self.gazetteer or bool(NAME_SUFFIX_REGEX.search(token)))
+            )
+            self._is_name[token] = result
+        return result
+
+    def _shift_date(self, match: re.Match) -> str:
+        day, month, year = int(match.group('day')), int(match.group('month')), int(match.group('year'))
+        if year < 2 or not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+            return match.group()
+        shifted = date(year, month, day) - self.date_shift
+        sep = match.group('sep')
+        return f'{shifted.day:02d}{sep}{shifted.month:02d}{sep}{shifted.year}'
+
+    def deidentify(self, text: str) -> str:
+        """Return text with names, IDs and dates replaced and file paths removed.
+
+        Consecutive name tokens separated only by whitespace (first and
+        last name) become a single pseudonym.
+        """
+        pieces = []
+        position = 0
+        name_start = name_end = -1
+        for match in DEIDENTIFY_REGEX.finditer(text):
+            kind = match.lastgroup
+            if kind == 'token':
+                if not self.is_name(match.group()):
+                    continue
+                if name_start >= 0 and text[name_end:match.start()].isspace():
+                    name_end = match.end()
+                    continue
+            if name_start >= 0:
+                pieces.append(text[position:name_start])
+                pieces.append(self.pseudonym('NAME', ' '.join(text[name_start:name_end].split())))
+                position = name_end
+                name_start = -1
+            if kind == 'token':
+                name_start, name_end = match.span()
+                continue
+
+            pieces.append(text[position:match.start()])
+            if kind == 'id':
+                pieces.append(self.pseudonym('ID', match.group()))
+            elif kind == 'date':
+                pieces.append(self._shift_date(match) if self.date_shift else match.group())
+            position = match.end()
+
+        if name_start >= 0:
+            pieces.append(text[position:name_start])
+            pieces.append(self.pseudonym('NAME', ' '.join(text[name_start:name_end].split())))
+            position = name_end
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+    def deidentify_stream(self, texts: Iterable[str]) -> Iterator[str]:
+        """De-identify texts (pages, lines) one at a time."""
+        for text in texts:
+            yield self.deidentify(text)
+
+def main():
+    parser = argparse.ArgumentParser(description='De-identify Hebrew medical text')
+
+    parser.add_argument(
+        '--input_file',
+        default=None,
+        help='Text file to de-identify line by line (default: stdin)'
+    )
+
+    parser.add_argument(
+        '--parameters_file',
+        default='transformed_parameters.csv',
+        help='Field parameters whose words, like the extractor\'s field labels, are never names'
+    )
+
+    parser.add_argument(
+        '--shift_dates',
+        action='store_true',
+        help='Shift dates by a key-derived number of days'
+    )
+
+    args = parser.parse_args()
+
+    deidentifier = Deidentifier(
+        shift_dates=args.shift_dates,
+        exclude=name_stopwords(args.parameters_file)
+    )
+    lines = open(args.input_file, encoding='utf-8') if args.input_file else sys.stdin
+    try:
+        for line in deidentifier.deidentify_stream(lines):
+            sys.stdout.write(line)
+    finally:
+        if args.input_file:
+            lines.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from array import array
+from typing import List, Dict, Any, Tuple
+
+class EntityTable:
+    """Column store for entities extracted from many documents.
+
+    Offsets, label ids and confidences live in typed arrays; documents are
+    referenced by id and entity text is sliced from them on demand. With
+    keep_documents=False no document text is retained: only the text
+    slice of each entity is stored as it is added.
+    """
+
+    def __init__(self, documents: List[str] = None, keep_documents: bool = True):
+        self.documents = (documents if documents is not None else []) if keep_documents else None
+        self.num_documents = len(documents) if documents is not None else 0
+        self.texts: List[str] = None if keep_documents else []
+        self.labels: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+        self.doc_ids = array('I')
+        self.label_ids = array('H')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.text_starts = array('I')
+        self.text_ends = array('I')
+        self.confidences = array('f')
+
+    def __len__(self) -> int:
+        return len(self.label_ids)
+
+    def __getitem__(self, index: int) -> 'Entity':
+        return Entity(self, index)
+
+    def add_document(self, text: str) -> int:
+        """Register a document and return its id."""
+        if self.documents is not None:
+            self.documents.append(text)
+        self.num_documents += 1
+        return self.num_documents - 1
+
+    def label_id(self, label: str) -> int:
+        """Return the id of label, assigning a new one on first use."""
+        if label not in self._label_ids:
+            self._label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return self._label_ids[label]
+
+    def add(self, doc_id: int, label: str, start: int, end: int,
+            text_start: int, text_end: int, confidence: float = 1.0,
+            document: str = None):
+        """Append one entity row.
+
+        document is the entity's source text; it is only needed (to keep
+        the entity's slice) when the table does not keep documents.
+        """
+        self.doc_ids.append(doc_id)
+        self.label_ids.append(self.label_id(label))
+        self.starts.append(start)
+        self.ends.append(end)
+        self.text_starts.append(text_start)
+        self.text_ends.append(text_end)
+        self.confidences.append(confidence)
+        if self.texts is not None:
+            self.texts.append(document[text_start:text_end])
+
+class Entity:
+    """Lightweight view of one row of an EntityTable."""
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: EntityTable, index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def doc_id(self) -> int:
+        return self.table.doc_ids[self.index]
+
+    @property
+    def label(self) -> str:
+        return self.table.labels[self.table.label_ids[self.index]]
+
+    @property
+    def start(self) -> int:
+        return self.table.starts[self.index]
+
+    @property
+    def end(self) -> int:
+        return self.table.ends[self.index]
+
+    @property
+    def confidence(self) -> float:
+        return self.table.confidences[self.index]
+
+    @property
+    def text(self) -> str:
+        if self.table.texts is not None:
+            return self.table.texts[self.index]
+        document = self.table.documents[self.doc_id]
+        return document[self.table.text_starts[self.index]:self.table.text_ends[self.index]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'text': self.text,
+            'label': self.label,
+            'confidence': self.confidence,
+            'start': self.start,
+            'end': self.end
+        }
+
+class DocumentResult:
+    """Entities and section offsets of one document in an EntityTable."""
+    __slots__ = ('table', 'doc_id', 'first', 'last', 'sections')
+
+    def __init__(self, table: EntityTable, doc_id: int, first: int, last: int,
+                 sections: Dict[str, Tuple[int, int]]):
+        self.table = table
+        self.doc_id = doc_id
+        self.first = first
+        self.last = last
+        self.sections = sections
+
+    @property
+    def text(self) -> str:
+        """The document text, or None when the table does not keep documents."""
+        if self.table.documents is None:
+            return None
+        return self.table.documents[self.doc_id]
+
+    @property
+    def entities(self) -> List[Entity]:
+        return [Entity(self.table, i) for i in range(self.first, self.last)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'doc_id': self.doc_id,
+            'entities': [entity.to_dict() for entity in self.entities],
+            'sections': self.sections
+        }
@@ -0,0 +1,87 @@
+from typing import FrozenSet
+import csv
+
+from functional_scores import FIM_ITEMS
+from name_gazetteer import TOKEN_REGEX
+from nemo_parser import DEFAULT_SECTION_HEADERS
+
+FIELD_PATTERNS = {
+    #'patient_id': r'(?:ת\.?ז\.?:?\s*|מספר\s*תיק\s*רפואי:?\s*)(\d{9})',
+    'patient_id': '(ID_\\d{6})',
+    'name': r'(?:שם:?\s*|ת\/המטופל:?\s*)(NAME_\d{6}|[א-ת\s]+)',
+    'admission_date': r'תאריך\s*קבלה:?\s*(\d{2}[./]\d{1,2}[./]\d{4})',
+    'discharge_date': r'תאריך\s*שחרור:?\s*(\d{2}[./]\d{1,2}[./]\d{4})',
+    'gender': r'(?:מגדר:?\s*|:?\s*)(מר|גברת|זכר|נקבה)',
+    'age_at_admission': r'(?:גיל:?\s*(?:בן|בת)?\s*|בן\s*)(\d+)',
+    'holocaust_survivor': r'(?:ניצול|ניצולת)\s*שואה|מוכר\s*כניצול\s*שואה',
+    #'living_arrangement': r'(?:גר\s*(?:עם)?:?\s*|עם:?\s*)([^\.]+)',
+    'floor_number': r'קומה:?\s*(\d+)',
+    'elevator': r'(?:מעלית:?\s*|:?\s*)(?:עם|ללא)\s*מעלית',
+    #'mobility': r'(?:הליכה|ניידות):?\s*([^\.]+)',
+    #'transfers': r'(?:העברות|מעברים):?\s*([^\.]+)',
+    #'dressing': r'(?:לבוש|הלבשה):?\s*([^\.]+)',
+    #'bathing': r'(?:רחצה|אמבטיה|מקלחת):?\s*([^\.]+)',
+    #'eating_status': r'(?:אכילה):?\s*([^\.]+)',
+    #'continence': r'(?:שליטה\s*על\s*סוגרים|טיפול\s*בסוגרים):?\s*([^\.]+)',
+    #'cognitive_status': r'(?:מצב\s*קוגניטיבי|קוגניטיבי):?\s*([^\.]+)',
+    #'physical_examination': r'(?:בדיקה\s*גופנית|בדיקה\s*בקבלה):?\s*([^\.]+)',
+    #'diagnoses': r'(?:אבחנות\s*(?:עיקריות)?:?\s*|[\.\d]+\s*)([^\.]+)',
+    'admission_reason': r'(?:סיבת\s*(?:קבלה|אשפוז|הפניה)|התקבל\s*עקב):?\s*([^\.]+)',
+    #'admission_source': r'(?:התקבל|הגיע)\s*מ:?\s*([^\.]+)',
+    #'medications_type': r'(?:תרופות|טיפול\s*תרופתי):?\s*([^\.]+)',
+    'allergies': r'אלרגיות:?\s*([^\.]+)',
+    #'tests': r'(?:בדיקות|בדיקה):?\s*([^\.]+)',
+    'rehabilitation_type': r'סוג\s*שיקום:?\s*([^\.]+)',
+    'past_procedures': r'(?:פרוצדורות|טיפולים)\s*(?:בעבר|קודמים):?\s*([^\.]+)',
+    #'residence_type': r'(?:סוג\s*(?:מגורים|דיור)|מקום\s*מגורים):?\s*([^\.]+)',
+    'stairs_count': r'מדרגות:?\s*([\d]+)',
+    'general_appearance': r'מראה\s*כללי:?\s*([^\.]+)',
+    'assistive_devices': r'(?:אביזרי|עזרי)\s*עזר:?\s*([^\.]+)',
+    'pressure_ulcer': r'פצעי\s*לחץ:?\s*([^\.]+)',
+    'pain_level': r'(?:רמת|עוצמת)\s*כאב:?\s*([^\.]+)',
+    'sleep_issues': r'בעיות\s*שינה:?\s*([^\.]+)',
+    'constipation': r'עצירות:?\s*([^\.]+)',
+    'handedness': r'(?:דומיננטיות|יד\s*דומיננטית):?\s*([^\.]+)',
+    'education_years': r'(?:שנות\s*לימוד|השכלה):?\s*(\d+)\s*(?:שנים)?',
+    'covid_vaccine': r'חיסון\s*קורונה:?\s*([^\.]+)',
+    'previous_functioning': r'תפקוד\s*קודם:?\s*([^\.]+)',
+    'outdoor_mobility': r'ניידות\s*(?:בחוץ|מחוץ\s*לבית):?\s*([^\.]+)',
+    #'aid_law': r'(?:חוק\s*סיעוד|גמלת\s*סיעוד):?\s*([^\.]+)',
+    'cognitive_assessment': r'הערכה\s*קוגניטיבית:?\s*([^\.]+)',
+    'consciousness': r'(?:הכרה|מצב\s*הכרה):?\s*([^\.]+)',
+    'sensation': r'תחושה:?\s*([^\.]+)',
+    'gross_strength': r'כוח\s*גס:?\s*([^\.]+)',
+    'ecg': r'(?:א\.?ק\.?ג|EKG|ECG):?\s*([^\.]+)',
+    #'nursing_care_claim': r'(?:תביעת\s*סיעוד|תביעה\s*לגמלת\s*סיעוד):?\s*([^\.]+)',
+    #'language_communication': r'(?:תקשורת|שפה|הבעה):?\s*([^\.]+)',
+    'mood': r'מצב\s*רוח:?\s*([^\.]+)',
+    'appetite': r'תיאבון:?\s*([^\.]+)',
+    'anxiety': r'חרדה:?\s*([^\.]+)',
+    #'hospitalization_extension': r'הארכת\s*אשפוז:?\s*([^\.]+)'
+}
+
+# hebrew_names.csv also lists surnames that are everyday words ('בית',
+# 'שם', 'גר'); these are never flagged as names
+COMMON_WORDS = frozenset([
+    'או', 'של', 'זה', 'עם', 'על', 'יש', 'גם', 'את', 'כי', 'לא', 'כל', 'מה', 'אם',
+    'בן', 'בת', 'שם', 'מר', 'גר', 'יום', 'ביום', 'שעה', 'עבר', 'יתר', 'תור', 'בית',
+    'לידה', 'חתימה', 'מטר', 'מיטה', 'סבל', 'פריט', 'מרפאת', 'מרבית', 'ישראלי',
+    'סה"כ', 'בקבלה', 'בשחרור', 'לבוש'
+])
+
+def name_stopwords(parameters_file: str) -> FrozenSet[str]:
+    """Words never flagged as names in letters.
+
+    COMMON_WORDS plus every word of the field values in parameters_file
+    (transformed_parameters.csv), the field patterns, the section headers
+    and the FIM item labels.
+    """
+    with open(parameters_file, encoding='utf-8') as f:
+        values = [value for row in csv.DictReader(f)
+                  for column, value in row.items() if column != 'Field' and value]
+    return COMMON_WORDS | frozenset(TOKEN_REGEX.findall(' '.join([
+        *values,
+        *FIELD_PATTERNS.values(),
+        *DEFAULT_SECTION_HEADERS.values(),
+        *(label for _, label, _ in FIM_ITEMS)
+    ])))
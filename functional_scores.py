@@ -0,0 +1,191 @@
+from dataclasses import dataclass
+from typing import List, Tuple, Iterable, Optional
+import itertools
+import re
+import numpy as np
+
+from name_gazetteer import TOKEN_REGEX
+
+# FIM table items as printed in the letters (item, label, subscale)
+FIM_ITEMS = [
+    ('eating', 'אכילה', 'motor'),
+    ('grooming', 'טיפול עצמי', 'motor'),
+    ('bathing', 'רחצה', 'motor'),
+    ('dressing_upper', 'הלבשה - גוף עליון', 'motor'),
+    ('dressing_lower', 'הלבשה - גוף תחתון', 'motor'),
+    ('bladder', 'טיפול בסוגרים - שתן', 'motor'),
+    ('bowel', 'טיפול בסוגרים - צואה', 'motor'),
+    ('transfer_bed', 'העברות - מיטה/כסא', 'motor'),
+    ('transfer_toilet', 'העברות - שירותים', 'motor'),
+    ('transfer_tub', 'העברות - אמבטיה/מקלחת', 'motor'),
+    ('locomotion', 'ניידות', 'motor'),
+    ('stairs', 'מדרגות', 'motor'),
+    ('comprehension', 'הבנה', 'cognitive'),
+    ('expression', 'הבעה', 'cognitive'),
+    ('social_interaction', 'אינטראקציה חברתית', 'cognitive'),
+    ('problem_solving', 'פתרון בעיות', 'cognitive'),
+    ('memory', 'זיכרון', 'cognitive'),
+]
+FIM_MOTOR = np.array([subscale == 'motor' for _, _, subscale in FIM_ITEMS])
+FIM_COGNITIVE = ~FIM_MOTOR
+
+# One scan finds item scores ('4/7'), stated FIM totals ('60/126') and
+# FIM/MMSE mentions; every alternative starts with a literal, so the
+# scan skips straight between them. Values and item labels are then read
+# from the few characters around each hit.
+FIM_SCAN_REGEX = re.compile(r'/\s*(?:7|126)(?![\d/])|FIM|MMSE')
+FIM_VALUE_REGEX = re.compile(r'(?<![\d/.])(\d{1,3})\s*$')
+MMSE_REGEX = re.compile(r'MMSE:?\s*(\d+)\s*/\s*30(?!\d)')
+# A score given right after a FIM mention ('FIM 5', 'FIM בקבלה 5'), not
+# a number further on in the prose ('... בציוני ה-FIM ... 50 מטר')
+FIM_MENTION_REGEX = re.compile(r'FIM:?\s*(?:(?:בקבלה|בשחרור)\s*)?(\d{1,3})(?![\d/])')
+# Items by the last word of their label, which is unique and survives the
+# redactions and OCR damage seen in group prefixes ('הלבשה - "ףף" גוף
+# עליון'); labels are looked up within this many characters of a score
+FIM_ITEM_KEYWORDS = {label.split()[-1].split('/')[-1]: i for i, (_, label, _) in enumerate(FIM_ITEMS)}
+FIM_LABEL_WINDOW = 40
+
+@dataclass
+class FunctionalScores:
+    """FIM and MMSE scores of one letter; None where not found.
+
+    fim_items holds the (admission, discharge) score of every FIM_ITEMS
+    item, -1 where missing. Subscores are only computed when all their
+    items were read; fim_total_* prefer the total stated in the letter.
+    fim_mention is the score right after the first FIM mention that has
+    one, for forms that give a single score instead of the table.
+    """
+    fim_items: np.ndarray
+    fim_motor_admission: Optional[int] = None
+    fim_motor_discharge: Optional[int] = None
+    fim_cognitive_admission: Optional[int] = None
+    fim_cognitive_discharge: Optional[int] = None
+    fim_total_admission: Optional[int] = None
+    fim_total_discharge: Optional[int] = None
+    fim_mention: Optional[int] = None
+    mmse: Optional[int] = None
+
+def scan_fim_table(text: str) -> Tuple[np.ndarray, List[int], Optional[int], Optional[int]]:
+    """Read the FIM table and MMSE score of text in one scan.
+
+    Returns the int8 (len(FIM_ITEMS), 2) item array, the stated totals,
+    the FIM mention and the MMSE score. Scores follow their item in text
+    extracted from the PDF; in OCR of the right-to-left table they
+    precede it in reverse order, which shows as the stated totals
+    preceding rather than following their FIM label. A row counts only
+    with both its scores.
+    """
+    items = np.full((len(FIM_ITEMS), 2), -1, dtype=np.int8)
+    starts = [i for i in (text.find('FIM'), text.find('MMSE')) if i >= 0]
+    if not starts:
+        return items, [], None, None
+
+    # Tokens (kind, value, start, end) with kind 'score', 'total', 'fim' or 'mmse'
+    tokens = []
+    fim_mention = None
+    mmse = None
+    for match in FIM_SCAN_REGEX.finditer(text, min(starts)):
+        token = match.group()
+        if token == 'FIM':
+            mention = FIM_MENTION_REGEX.match(text, match.start())
+            if fim_mention is None and mention:
+                fim_mention = int(mention.group(1))
+            tokens.append(('fim', None) + match.span())
+        elif token == 'MMSE':
+            mmse_match = MMSE_REGEX.match(text, match.start())
+            if mmse is None and mmse_match:
+                mmse = int(mmse_match.group(1))
+            tokens.append(('mmse', None) + match.span())
+        else:
+            value = FIM_VALUE_REGEX.search(text, max(0, match.start() - 8), match.start())
+            if not value:
+                continue
+            kind = 'total' if token.endswith('126') else 'score'
+            if kind == 'score' and not 1 <= int(value.group(1)) <= 7:
+                continue
+            tokens.append((kind, int(value.group(1)), value.start(1), match.end()))
+
+    first_total = next((i for i, token in enumerate(tokens) if token[0] == 'total'), None)
+    scores_follow = first_total is None or (first_total > 0 and tokens[first_total - 1][0] == 'fim')
+
+    # Walk the tokens in reading order of the rows: the label is on the
+    # walk's near side of a row's first score, then come its admission
+    # and discharge scores
+    walk = tokens if scores_follow else tokens[::-1]
+
+    def label_at(k: int) -> Optional[int]:
+        """FIM_ITEMS index of the label nearest to walk[k] on its label side."""
+        if scores_follow:
+            end = walk[k][2]
+            start = max(walk[k - 1][3] if k > 0 else 0, end - FIM_LABEL_WINDOW)
+        else:
+            start = walk[k][3]
+            end = min(walk[k - 1][2] if k > 0 else len(text), start + FIM_LABEL_WINDOW)
+        words = TOKEN_REGEX.findall(text, start, end)
+        for word in (reversed(words) if scores_follow else words):
+            if word in FIM_ITEM_KEYWORDS:
+                return FIM_ITEM_KEYWORDS[word]
+        return None
+
+    labels = [label_at(k) if token[0] == 'score' else None for k, token in enumerate(walk)]
+    rows = {}
+    for k in range(len(walk) - 1):
+        item = labels[k]
+        if (item is not None and item not in rows and walk[k + 1][0] == 'score'
+                and labels[k + 1] is None):
+            rows[item] = walk[k][1], walk[k + 1][1]
+    if rows:
+        items[list(rows)] = list(rows.values())
+
+    totals = []
+    if first_total is not None:
+        totals = [token[1] for token in itertools.takewhile(
+            lambda token: token[0] == 'total', tokens[first_total:]
+        )]
+        if not scores_follow:
+            totals.reverse()
+    return items, totals[:2], fim_mention, mmse
+
+def fim_subscores(items: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Motor, cognitive and total FIM of a (letters, len(FIM_ITEMS), 2) batch.
+
+    Each result has shape (letters, 2) for admission and discharge, NaN
+    where an item of the subscale is missing.
+    """
+    scores = np.where(items < 0, np.nan, items.astype(np.float32))
+    motor = scores[:, FIM_MOTOR].sum(axis=1)
+    cognitive = scores[:, FIM_COGNITIVE].sum(axis=1)
+    return motor, cognitive, motor + cognitive
+
+def parse_functional_scores_batch(texts: Iterable[str]) -> List[FunctionalScores]:
+    """FunctionalScores of many letters, with the subscores computed as one batch."""
+    scans = [scan_fim_table(text) for text in texts]
+    if not scans:
+        return []
+    items = np.stack([scan[0] for scan in scans])
+    stated = np.full((len(scans), 2), np.nan, dtype=np.float32)
+    for i, (_, totals, _, _) in enumerate(scans):
+        stated[i, :len(totals)] = totals
+    motor, cognitive, computed = fim_subscores(items)
+    total = np.where(np.isnan(stated), computed, stated)
+
+    def optional(value) -> Optional[int]:
+        return None if np.isnan(value) else int(value)
+
+    return [
+        FunctionalScores(
+            fim_items=items[i],
+            fim_motor_admission=optional(motor[i, 0]),
+            fim_motor_discharge=optional(motor[i, 1]),
+            fim_cognitive_admission=optional(cognitive[i, 0]),
+            fim_cognitive_discharge=optional(cognitive[i, 1]),
+            fim_total_admission=optional(total[i, 0]),
+            fim_total_discharge=optional(total[i, 1]),
+            fim_mention=fim_mention,
+            mmse=mmse
+        )
+        for i, (_, _, fim_mention, mmse) in enumerate(scans)
+    ]
+
+def parse_functional_scores(text: str) -> FunctionalScores:
+    return parse_functional_scores_batch([text])[0]
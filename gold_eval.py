@@ -0,0 +1,281 @@
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Any, Tuple
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+EXTRACTOR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nemo-extractor.py')
+NOT_FOUND = 'not_found'
+
+def load_extractor():
+    """Import nemo-extractor.py, which loads the NER model on import."""
+    spec = importlib.util.spec_from_file_location('nemo_extractor', EXTRACTOR_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_gold(gold_file: str) -> pd.DataFrame:
+    """Expected values in the patient_data.csv schema, indexed by filename."""
+    gold = pd.read_csv(gold_file, dtype=str, keep_default_na=False)
+    return gold.set_index('filename')
+
+def load_texts(texts_file: str) -> Dict[str, str]:
+    """Full text of each file from a searchable_text.csv/ocr_text.csv export.
+
+    Pages are joined in page order, as build-table-nemo.js does.
+    """
+    pages = pd.read_csv(texts_file, dtype=str, keep_default_na=False)
+    column = 'Text Content' if 'Text Content' in pages.columns else 'OCR Text'
+    pages['Page Number'] = pages['Page Number'].astype(int)
+    pages = pages.sort_values(['Filename', 'Page Number'])
+    return {
+        os.path.basename(filename): ' '.join(group[column])
+        for filename, group in pages.groupby('Filename')
+    }
+
+def normalize_value(value: Any) -> str:
+    return re.sub(r'\s+', ' ', str(value)).strip()
+
+def score_fields(
+    gold: pd.DataFrame,
+    predictions: Dict[str, Dict[str, str]],
+    fuzzy_threshold: int = 85
+) -> Dict[str, Any]:
+    """Per-field and overall exact and fuzzy accuracy.
+
+    A field of a document is scored when either the expected or the
+    predicted value is not not_found, so agreeing on not_found does not
+    inflate accuracy.
+    """
+    fields = {}
+    exact_total = fuzzy_total = scored_total = 0
+    for field in gold.columns:
+        exact = fuzzy = scored = 0
+        for filename, expected in gold[field].items():
+            expected = normalize_value(expected)
+            predicted = normalize_value(predictions[filename].get(field, NOT_FOUND))
+            if expected == NOT_FOUND and predicted == NOT_FOUND:
+                continue
+            scored += 1
+            if predicted == expected:
+                exact += 1
+                fuzzy += 1
+            elif NOT_FOUND not in (expected, predicted) and fuzz.ratio(predicted, expected) >= fuzzy_threshold:
+                fuzzy += 1
+        if scored:
+            fields[field] = {
+                'exact': exact / scored,
+                'fuzzy': fuzzy / scored,
+                'support': scored
+            }
+        exact_total += exact
+        fuzzy_total += fuzzy
+        scored_total += scored
+    return {
+        'exact': exact_total / scored_total if scored_total else 0.0,
+        'fuzzy': fuzzy_total / scored_total if scored_total else 0.0,
+        'support': scored_total,
+        'fields': fields
+    }
+
+def run_extractor(extractor, texts: Dict[str, str], mode: str,
+                  repeats: int = 1) -> Tuple[Dict[str, Dict[str, str]], List[float], float]:
+    """Extract every document repeats times after one untimed warm-up document.
+
+    Returns the predictions of the first pass, per-document latencies in
+    seconds and the total timed wall-clock seconds.
+    """
+    parameters = [
+        extractor.FieldOption(field=field, options=extractor.get_field_options(field))
+        for field in extractor.params_df['Field'].unique()
+    ]
+    extractor.extract_entities(next(iter(texts.values())), parameters, mode=mode, verbose=False)
+
+    predictions = {}
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for filename, text in texts.items():
+            document_start = time.perf_counter()
+            entities = extractor.extract_entities(text, parameters, mode=mode, verbose=False)
+            latencies.append(time.perf_counter() - document_start)
+            predictions.setdefault(filename, entities)
+    return predictions, latencies, time.perf_counter() - start
+
+def evaluate(
+    gold_file: str,
+    texts_file: str,
+    mode: str = 'both',
+    repeats: int = 1,
+    fuzzy_threshold: int = 85
+) -> Dict[str, Any]:
+    """Score the extractor against the gold set and time it."""
+    gold = load_gold(gold_file)
+    texts = load_texts(texts_file)
+    missing = [filename for filename in gold.index if filename not in texts]
+    if missing:
+        raise ValueError(f"No text found for gold documents: {missing}")
+    texts = {filename: texts[filename] for filename in gold.index}
+
+    extractor = load_extractor()
+    predictions, latencies, seconds = run_extractor(extractor, texts, mode, repeats)
+    report = score_fields(gold, predictions, fuzzy_threshold)
+    latencies_ms = 1000 * np.array(latencies)
+    report.update({
+        'mode': mode,
+        'documents': len(texts),
+        'docs_per_sec': len(latencies) / seconds,
+        'latency_ms': {
+            'mean': float(latencies_ms.mean()),
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p95': float(np.percentile(latencies_ms, 95))
+        }
+    })
+    return report
+
+def check_regressions(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    max_accuracy_drop: float = 0.01,
+    max_throughput_drop: float = 0.10
+) -> List[str]:
+    """Compare report with a baseline report; return a message per regression.
+
+    Accuracy drops are absolute (per field and overall), throughput drops
+    are relative to the baseline docs/sec.
+    """
+    failures = []
+    for metric in ('exact', 'fuzzy'):
+        drop = baseline[metric] - report[metric]
+        if drop > max_accuracy_drop:
+            failures.append(f"overall {metric} accuracy dropped {drop:.4f} "
+                            f"({baseline[metric]:.4f} -> {report[metric]:.4f})")
+        for field, expected in baseline['fields'].items():
+            current = report['fields'].get(field, {metric: 0.0})[metric]
+            drop = expected[metric] - current
+            if drop > max_accuracy_drop:
+                failures.append(f"{field} {metric} accuracy dropped {drop:.4f} "
+                                f"({expected[metric]:.4f} -> {current:.4f})")
+
+    drop = 1 - report['docs_per_sec'] / baseline['docs_per_sec']
+    if drop > max_throughput_drop:
+        failures.append(f"throughput dropped {drop:.1%} "
+                        f"({baseline['docs_per_sec']:.2f} -> {report['docs_per_sec']:.2f} docs/sec)")
+    return failures
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nGold-set evaluation ({report['mode']}, {report['documents']} documents):")
+    print("=" * 60)
+    print(f"{'Field':<30} {'Exact':<8} {'Fuzzy':<8} {'Support':<8}")
+    print("-" * 60)
+    for field, scores in sorted(report['fields'].items()):
+        print(f"{field:<30} {scores['exact']:<8.4f} {scores['fuzzy']:<8.4f} {scores['support']:<8}")
+    print("-" * 60)
+    print(f"{'overall':<30} {report['exact']:<8.4f} {report['fuzzy']:<8.4f} {report['support']:<8}")
+    latency = report['latency_ms']
+    print(f"\nThroughput: {report['docs_per_sec']:.2f} docs/sec, latency: "
+          f"mean {latency['mean']:.1f} ms, p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Gold-set accuracy and throughput regression check')
+
+    parser.add_argument(
+        '--gold_file',
+        default='patient_data.csv',
+        help='Expected field values in the patient_data.csv schema'
+    )
+
+    parser.add_argument(
+        '--texts_file',
+        default='results/ocr_text.csv',
+        help='Document texts (searchable_text.csv or ocr_text.csv export)'
+    )
+
+    parser.add_argument(
+        '--mode',
+        choices=['regex', 'ner', 'both'],
+        default='both',
+        help='Extractors to run'
+    )
+
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=1,
+        help='Timed passes over the corpus'
+    )
+
+    parser.add_argument(
+        '--fuzzy_threshold',
+        type=int,
+        default=85,
+        help='Minimum fuzz.ratio for a fuzzy match'
+    )
+
+    parser.add_argument(
+        '--output_file',
+        default='gold_eval_report.json',
+        help='Where to write the report'
+    )
+
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='Earlier report to compare against; exits non-zero on regressions'
+    )
+
+    parser.add_argument(
+        '--max_accuracy_drop',
+        type=float,
+        default=0.01,
+        help='Largest allowed absolute drop in any exact/fuzzy accuracy'
+    )
+
+    parser.add_argument(
+        '--max_throughput_drop',
+        type=float,
+        default=0.10,
+        help='Largest allowed relative drop in docs/sec'
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    report = evaluate(
+        gold_file=args.gold_file,
+        texts_file=args.texts_file,
+        mode=args.mode,
+        repeats=args.repeats,
+        fuzzy_threshold=args.fuzzy_threshold
+    )
+    print_report(report)
+
+    with open(args.output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"Report saved to {args.output_file}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        failures = check_regressions(
+            report, baseline, args.max_accuracy_drop, args.max_throughput_drop
+        )
+        if failures:
+            for failure in failures:
+                logging.error(f"Regression: {failure}")
+            sys.exit(1)
+        logging.info("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from array import array
+from bisect import bisect_left
+from typing import List, Tuple, Iterable, FrozenSet
+import argparse
+import logging
+import mmap
+import os
+import re
+import struct
+
+NAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hebrew_names.csv')
+TRIE_FILE = os.path.splitext(NAMES_FILE)[0] + '.trie'
+# Where load() caches tries it had to build, since the source tree may be read-only
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                         'hebrew-medical-ner')
+
+# Binary layout (native byte order), every section 4-byte aligned:
+#   header: magic, alphabet size, node count, edge count
+#   alphabet (UTF-8), first_edge uint32[nodes + 1], terminal uint8[nodes],
+#   edge_label uint8[edges], edge_target uint32[edges]
+# Node 0 is the root; the edges of node n are first_edge[n]:first_edge[n + 1],
+# sorted by label (the 1-based index of the character in the alphabet).
+MAGIC = b'HNTRIE01'
+HEADER = struct.Struct('8sIII')
+
+# Names are Hebrew letters with an optional geresh/gershayim, as produced
+# by normalize_text in nemo-extractor.py
+NAME_REGEX = re.compile(r"[א-ת][א-ת'\"]+")
+TOKEN_REGEX = re.compile(r"[א-ת][א-ת'\"]*")
+
+def _padding(size: int) -> bytes:
+    return b'\0' * (-size % 4)
+
+def read_names(path: str = NAMES_FILE) -> List[str]:
+    """Read the names CSV (one name per line, with a BOM) and drop malformed entries."""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return [line.strip() for line in f if NAME_REGEX.fullmatch(line.strip())]
+
+def build_trie(names: Iterable[str]) -> bytes:
+    """Serialize names into the binary trie format read by NameGazetteer."""
+    names = sorted(set(names))
+    alphabet = sorted({char for name in names for char in name})
+    if len(alphabet) > 255:
+        raise ValueError("Name alphabet does not fit in one byte per edge label")
+    codes = {char: i + 1 for i, char in enumerate(alphabet)}
+
+    # Nested dicts, then breadth-first numbering so that each node's
+    # children are contiguous in the edge arrays
+    root = {}
+    for name in names:
+        node = root
+        for char in name:
+            node = node.setdefault(codes[char], {})
+        node[0] = True
+
+    first_edge = array('I', [0])
+    terminal = bytearray()
+    edge_label = bytearray()
+    edge_target = array('I')
+    queue = [root]
+    for node in queue:
+        terminal.append(1 if 0 in node else 0)
+        for label in sorted(label for label in node if label):
+            edge_label.append(label)
+            edge_target.append(len(queue))
+            queue.append(node[label])
+        first_edge.append(len(edge_label))
+
+    alphabet_bytes = ''.join(alphabet).encode('utf-8')
+    parts = [
+        HEADER.pack(MAGIC, len(alphabet_bytes), len(terminal), len(edge_label)),
+        alphabet_bytes + _padding(len(alphabet_bytes)),
+        first_edge.tobytes(),
+        bytes(terminal) + _padding(len(terminal)),
+        bytes(edge_label) + _padding(len(edge_label)),
+        edge_target.tobytes()
+    ]
+    return b''.join(parts)
+
+def build_trie_file(names_file: str = NAMES_FILE, trie_file: str = TRIE_FILE) -> str:
+    """Build the binary trie for names_file and write it atomically to trie_file."""
+    names = read_names(names_file)
+    data = build_trie(names)
+    # Per-process temporary name, so concurrent builds do not clobber each other
+    tmp_file = f"{trie_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, trie_file)
+    logging.info(f"Built name trie with {len(names)} names ({len(data)} bytes) at {trie_file}")
+    return trie_file
+
+def _map_file(path: str) -> mmap.mmap:
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class NameGazetteer:
+    """Longest-match name lookup over a memory-mapped binary trie."""
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        magic, alphabet_size, node_count, edge_count = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not a name trie file")
+        offset = HEADER.size
+
+        def take(size: int, fmt: str, itemsize: int):
+            nonlocal offset
+            section = view[offset:offset + size * itemsize].cast(fmt)
+            offset += size * itemsize + (-(size * itemsize) % 4)
+            return section
+
+        alphabet = bytes(take(alphabet_size, 'B', 1)).decode('utf-8')
+        self.codes = {char: i + 1 for i, char in enumerate(alphabet)}
+        self.first_edge = take(node_count + 1, 'I', 4)
+        self.terminal = take(node_count, 'B', 1)
+        self.edge_label = take(edge_count, 'B', 1)
+        self.edge_target = take(edge_count, 'I', 4)
+        self.node_count = node_count
+
+    @classmethod
+    def load(cls, trie_file: str = TRIE_FILE, names_file: str = NAMES_FILE) -> 'NameGazetteer':
+        """Memory-map trie_file, or a trie built from names_file when it is missing or stale.
+
+        trie_file is only read; build it explicitly by running this module.
+        A trie built here is cached in CACHE_DIR, keyed by the size and
+        modification time of names_file, or kept in memory when the cache
+        cannot be written.
+        """
+        if os.path.exists(trie_file) and not (
+            os.path.exists(names_file) and os.path.getmtime(names_file) > os.path.getmtime(trie_file)
+        ):
+            return cls(_map_file(trie_file))
+
+        stat = os.stat(names_file)
+        name = os.path.splitext(os.path.basename(names_file))[0]
+        cached = os.path.join(CACHE_DIR, f"{name}-{stat.st_size}-{stat.st_mtime_ns}.trie")
+        if os.path.exists(cached):
+            return cls(_map_file(cached))
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            build_trie_file(names_file, cached)
+        except OSError as e:
+            logging.warning(f"Cannot cache the name trie in {CACHE_DIR} ({e}); building it in memory")
+            return cls(build_trie(read_names(names_file)))
+        return cls(_map_file(cached))
+
+    def _child(self, node: int, char: str) -> int:
+        label = self.codes.get(char)
+        if label is None:
+            return -1
+        lo, hi = self.first_edge[node], self.first_edge[node + 1]
+        i = bisect_left(self.edge_label, label, lo, hi)
+        if i < hi and self.edge_label[i] == label:
+            return self.edge_target[i]
+        return -1
+
+    def longest_match(self, text: str, start: int = 0, end: int = None) -> int:
+        """End of the longest name starting at text[start] and ending by end, or -1."""
+        end = len(text) if end is None else end
+        node = 0
+        match_end = -1
+        for i in range(start, end):
+            node = self._child(node, text[i])
+            if node < 0:
+                break
+            if self.terminal[node]:
+                match_end = i + 1
+        return match_end
+
+    def __contains__(self, name: str) -> bool:
+        return self.longest_match(name) == len(name)
+
+    def find_runs(self, text: str, start: int = 0, end: int = None,
+                  exclude: FrozenSet[str] = frozenset()) -> List[Tuple[int, int, int]]:
+        """Scan text once and return (start, end, token_count) runs of name tokens.
+
+        A token is a name when the longest trie match from its first
+        character ends exactly at the token boundary and the token is not
+        in exclude. Name tokens separated only by whitespace form one run.
+        """
+        runs = []
+        run_start = run_end = -1
+        count = 0
+        for match in TOKEN_REGEX.finditer(text, start, len(text) if end is None else end):
+            token_start, token_end = match.span()
+            if (self.longest_match(text, token_start, token_end) != token_end
+                    or match.group() in exclude):
+                continue
+            if count and text[run_end:token_start].isspace():
+                run_end = token_end
+                count += 1
+                continue
+            if count:
+                runs.append((run_start, run_end, count))
+            run_start, run_end, count = token_start, token_end, 1
+        if count:
+            runs.append((run_start, run_end, count))
+        return runs
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the binary Hebrew name trie')
+
+    parser.add_argument(
+        '--names_file',
+        default=NAMES_FILE,
+        help='CSV with one name per line'
+    )
+
+    parser.add_argument(
+        '--trie_file',
+        default=TRIE_FILE,
+        help='Output binary trie file'
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_trie_file(args.names_file, args.trie_file)
+
+if __name__ == "__main__":
+    main()
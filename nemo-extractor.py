@@ -1,86 +1,126 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Iterable, Optional
 import torch
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 import uvicorn
 import re
 from fuzzywuzzy import fuzz
 import pandas as pd
-from datetime import datetime
+import calendar
+import functools
 from tabulate import tabulate
 import traceback
+import contextlib
+import os
+import unicodedata
+from array import array
 
-from nemo_parser import validate_documents
+from nemo_parser import validate_documents, DocumentProcessor, SectionSegmenter, DEFAULT_SECTION_HEADERS
+from name_gazetteer import NameGazetteer, TOKEN_REGEX
+from deidentify import Deidentifier
+from functional_scores import parse_functional_scores
+from field_patterns import FIELD_PATTERNS, name_stopwords
 
 
 app = FastAPI()
 
 
+# Opt-in inference modes for the NER model (NER_BF16=1, NER_COMPILE=1);
+# each falls back to fp32 eager when the machine does not support it.
+NER_BF16 = os.environ.get('NER_BF16') == '1'
+NER_COMPILE = os.environ.get('NER_COMPILE') == '1'
+
+# Minimum mean probability of a predicted entity span (NER_CONFIDENCE),
+# the probability above which a prediction replaces a value the patterns
+# already found (NER_OVERRIDE_CONFIDENCE; below it the NER model only
+# fills fields the patterns missed) and words per model input window,
+# which keeps every window within 512 tokens
+NER_CONFIDENCE = float(os.environ.get('NER_CONFIDENCE', '0.7'))
+NER_OVERRIDE_CONFIDENCE = float(os.environ.get('NER_OVERRIDE_CONFIDENCE', '0.95'))
+NER_WINDOW_WORDS = 200
+
+
+def setup_model(model, bf16: bool = False, compile: bool = False):
+    """Put the model in eval mode, compiling it when asked and possible.
+
+    Returns (model, bf16) with bf16 cleared when bf16 autocast is unsupported.
+    """
+    model.eval()
+    if bf16:
+        try:
+            bf16 = bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+        except (AttributeError, RuntimeError):
+            bf16 = False
+        if not bf16:
+            print("bf16 is not supported on this machine; using fp32")
+    if compile:
+        try:
+            compiled = torch.compile(model, dynamic=True)
+            # Compilation is lazy; fail here rather than on the first request
+            with torch.inference_mode():
+                compiled(**tokenizer("בדיקה", return_tensors='pt'))
+            model = compiled
+        except Exception as e:
+            print(f"torch.compile is not available ({e}); using eager mode")
+    return model, bf16
+
+
 tokenizer = AutoTokenizer.from_pretrained("hebrew-medical-ner-final")
 model = AutoModelForTokenClassification.from_pretrained("hebrew-medical-ner-final")
+model, NER_BF16 = setup_model(model, NER_BF16, NER_COMPILE)
 
 params_df = pd.read_csv('transformed_parameters.csv')
 
+# Memory-mapped trie over hebrew_names.csv (see NameGazetteer.load)
+name_gazetteer = NameGazetteer.load()
 
+COMPILED_FIELD_PATTERNS = {
+    field: re.compile(pattern, re.UNICODE) for field, pattern in FIELD_PATTERNS.items()
+}
 
-FIELD_PATTERNS = {
-    #'patient_id': r'(?:ת\.?ז\.?:?\s*|מספר\s*תיק\s*רפואי:?\s*)(\d{9})',
-    'patient_id': '(ID_\\d{6})',
-    'name': r'(?:שם:?\s*|ת\/המטופל:?\s*)([א-ת\s]+)',
-    'admission_date': r'תאריך\s*קבלה:?\s*(\d{2}[./]\d{1,2}[./]\d{4})',
-    'discharge_date': r'תאריך\s*שחרור:?\s*(\d{2}[./]\d{1,2}[./]\d{4})',
-    'gender': r'(?:מגדר:?\s*|:?\s*)(מר|גברת|זכר|נקבה)',
-    'age_at_admission': r'(?:גיל:?\s*(?:בן|בת)?\s*|בן\s*)(\d+)',
-    'holocaust_survivor': r'(?:ניצול|ניצולת)\s*שואה|מוכר\s*כניצול\s*שואה',
-    #'living_arrangement': r'(?:גר\s*(?:עם)?:?\s*|עם:?\s*)([^\.]+)',
-    'floor_number': r'קומה:?\s*(\d+)',
-    'elevator': r'(?:מעלית:?\s*|:?\s*)(?:עם|ללא)\s*מעלית',
-    #'mobility': r'(?:הליכה|ניידות):?\s*([^\.]+)',
-    #'transfers': r'(?:העברות|מעברים):?\s*([^\.]+)',
-    #'dressing': r'(?:לבוש|הלבשה):?\s*([^\.]+)',
-    #'bathing': r'(?:רחצה|אמבטיה|מקלחת):?\s*([^\.]+)',
-    #'eating_status': r'(?:אכילה):?\s*([^\.]+)',
-    #'continence': r'(?:שליטה\s*על\s*סוגרים|טיפול\s*בסוגרים):?\s*([^\.]+)',
-    #'cognitive_status': r'(?:מצב\s*קוגניטיבי|קוגניטיבי):?\s*([^\.]+)',
-    'mmse_score': r'MMSE:?\s*(\d+)\/30',
-    'fim_score': r'FIM\s*(?:סה"כ|בקבלה|בשחרור)?:?\s*(\d+)\/126',
-    #'physical_examination': r'(?:בדיקה\s*גופנית|בדיקה\s*בקבלה):?\s*([^\.]+)',
-    #'diagnoses': r'(?:אבחנות\s*(?:עיקריות)?:?\s*|[\.\d]+\s*)([^\.]+)',
-    'admission_reason': r'(?:סיבת\s*(?:קבלה|אשפוז|הפניה)|התקבל\s*עקב):?\s*([^\.]+)',
-    #'admission_source': r'(?:התקבל|הגיע)\s*מ:?\s*([^\.]+)',
-    #'medications_type': r'(?:תרופות|טיפול\s*תרופתי):?\s*([^\.]+)',
-    'allergies': r'אלרגיות:?\s*([^\.]+)',
-    #'tests': r'(?:בדיקות|בדיקה):?\s*([^\.]+)',
-    'rehabilitation_type': r'סוג\s*שיקום:?\s*([^\.]+)',
-    'past_procedures': r'(?:פרוצדורות|טיפולים)\s*(?:בעבר|קודמים):?\s*([^\.]+)',
-    #'residence_type': r'(?:סוג\s*(?:מגורים|דיור)|מקום\s*מגורים):?\s*([^\.]+)',
-    'stairs_count': r'מדרגות:?\s*([\d]+)',
-    'general_appearance': r'מראה\s*כללי:?\s*([^\.]+)',
-    'assistive_devices': r'(?:אביזרי|עזרי)\s*עזר:?\s*([^\.]+)',
-    'pressure_ulcer': r'פצעי\s*לחץ:?\s*([^\.]+)',
-    'pain_level': r'(?:רמת|עוצמת)\s*כאב:?\s*([^\.]+)',
-    'sleep_issues': r'בעיות\s*שינה:?\s*([^\.]+)',
-    'constipation': r'עצירות:?\s*([^\.]+)',
-    'handedness': r'(?:דומיננטיות|יד\s*דומיננטית):?\s*([^\.]+)',
-    'education_years': r'(?:שנות\s*לימוד|השכלה):?\s*(\d+)\s*(?:שנים)?',
-    'covid_vaccine': r'חיסון\s*קורונה:?\s*([^\.]+)',
-    'previous_functioning': r'תפקוד\s*קודם:?\s*([^\.]+)',
-    'outdoor_mobility': r'ניידות\s*(?:בחוץ|מחוץ\s*לבית):?\s*([^\.]+)',
-    #'aid_law': r'(?:חוק\s*סיעוד|גמלת\s*סיעוד):?\s*([^\.]+)',
-    'cognitive_assessment': r'הערכה\s*קוגניטיבית:?\s*([^\.]+)',
-    'consciousness': r'(?:הכרה|מצב\s*הכרה):?\s*([^\.]+)',
-    'sensation': r'תחושה:?\s*([^\.]+)',
-    'gross_strength': r'כוח\s*גס:?\s*([^\.]+)',
-    'ecg': r'(?:א\.?ק\.?ג|EKG|ECG):?\s*([^\.]+)',
-    #'nursing_care_claim': r'(?:תביעת\s*סיעוד|תביעה\s*לגמלת\s*סיעוד):?\s*([^\.]+)',
-    #'language_communication': r'(?:תקשורת|שפה|הבעה):?\s*([^\.]+)',
-    'mood': r'מצב\s*רוח:?\s*([^\.]+)',
-    'appetite': r'תיאבון:?\s*([^\.]+)',
-    'anxiety': r'חרדה:?\s*([^\.]+)',
-    #'hospitalization_extension': r'הארכת\s*אשפוז:?\s*([^\.]+)'
+# Sections (see nemo_parser.DEFAULT_SECTION_HEADERS) each field is expected in.
+# Fields not listed here, or whose sections are missing from a letter,
+# are searched across the full text.
+FIELD_SECTIONS = {
+    'ecg': ['physical_exam', 'tests'],
+    'gross_strength': ['physical_exam'],
+    'sensation': ['physical_exam'],
+    'consciousness': ['physical_exam'],
+    'general_appearance': ['physical_exam'],
+    'floor_number': ['living_situation', 'personal_info'],
+    'elevator': ['living_situation', 'personal_info'],
+    'stairs_count': ['living_situation', 'personal_info'],
 }
 
+# Comma-separated sections passed to the NER stage (NER_SECTIONS, e.g.
+# "physical_exam,tests"); unset runs it over the full text.
+NER_SECTIONS = [name.strip() for name in os.environ.get('NER_SECTIONS', '').split(',') if name.strip()]
+
+segmenter = SectionSegmenter()
+
+# Pattern extractor of the NER stage, reused for every letter
+document_processor = DocumentProcessor(model_path="hebrew-medical-ner-final")
+
+# Words never flagged as names (see field_patterns.name_stopwords)
+NAME_STOPWORDS = name_stopwords('transformed_parameters.csv')
+
+# Optional de-identification of every incoming letter (NER_DEIDENTIFY=1):
+# names and ID numbers become stable pseudonyms keyed by DEID_KEY, while
+# field labels and the other name stopwords are kept. Dates are shifted
+# only with DEID_SHIFT_DATES=1, since extracted dates are returned as is.
+deidentifier = None
+if os.environ.get('NER_DEIDENTIFY') == '1':
+    deidentifier = Deidentifier(
+        gazetteer=name_gazetteer,
+        shift_dates=os.environ.get('DEID_SHIFT_DATES', '0') == '1',
+        exclude=NAME_STOPWORDS
+    )
+
+# Titles and labels after which a single name token counts as a name
+NAME_CUE_REGEX = re.compile(r'(?:שם|המטופל(?:/ת)?|מר|גברת|גב\'|ד"ר|פרופ\')\s*:?\s*$')
+NAME_CUE_WINDOW = 20
+
 
 class FieldOption(BaseModel):
     field: str
@@ -90,68 +130,195 @@ class TextInput(BaseModel):
     text: str
     parameters: List[FieldOption]
 
+def _build_normalize_replacements() -> Dict[int, str]:
+    """Characters changed by normalize_text, as a str.translate mapping.
+
+    Removes bidi controls, zero-width characters, niqqud and cantillation
+    marks; maps Hebrew and typographic quotes to ASCII, maqaf to '-', and
+    Hebrew presentation forms and Latin ligatures left by the PDF/OCR
+    step to plain letters.
+    """
+    removed = [0x061C, 0x200B, 0x200C, 0x200D, 0x200E, 0x200F, 0xFEFF]
+    removed += list(range(0x202A, 0x202F)) + list(range(0x2066, 0x206A))
+    removed += list(range(0x0591, 0x05BE)) + [0x05BF, 0x05C1, 0x05C2, 0x05C4, 0x05C5, 0x05C7]
+    replacements = {c: None for c in removed}
+    replacements.update({
+        ord('\u05F4'): '"', ord('\u201C'): '"', ord('\u201D'): '"', ord('\u201E'): '"',
+        ord('\u05F3'): "'", ord('\u2018'): "'", ord('\u2019'): "'", ord('\u201A'): "'",
+        ord('\u05BE'): '-'
+    })
+    for c in list(range(0xFB00, 0xFB07)) + list(range(0xFB1D, 0xFB50)):
+        plain = unicodedata.normalize('NFKD', chr(c)).translate(replacements)
+        if plain and plain != chr(c):
+            replacements[c] = plain
+    return replacements
+
+NORMALIZE_REPLACEMENTS = _build_normalize_replacements()
+
+# Dense table over the BMP: str.translate never misses a lookup, which is
+# several times faster than translating through the sparse dict
+NORMALIZE_TABLE = [NORMALIZE_REPLACEMENTS.get(c, c) for c in range(0x10000)]
+
 def normalize_text(text: str) -> str:
-    text = text.replace('\n', ' ')
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+    """Clean OCR/PDF text and collapse all whitespace runs to single spaces."""
+    return ' '.join(text.translate(NORMALIZE_TABLE).split())
+
+def normalize_text_with_offsets(text: str) -> Tuple[str, array]:
+    """normalize_text that also maps every output character to its index in text.
+
+    A span (start, end) of the normalized text corresponds to
+    text[offsets[start]:offsets[end - 1] + 1].
+    """
+    chars = []
+    offsets = array('I')
+    space_at = None
+    for i, char in enumerate(text):
+        mapped = NORMALIZE_REPLACEMENTS.get(ord(char), char)
+        if not mapped:
+            continue
+        if mapped.isspace():
+            if space_at is None and chars:
+                space_at = i
+            continue
+        if space_at is not None:
+            chars.append(' ')
+            offsets.append(space_at)
+            space_at = None
+        chars.append(mapped)
+        offsets.extend([i] * len(mapped))
+    return ''.join(chars), offsets
+
+# Accepted date formats: dd/mm/yyyy, dd.mm.yyyy, yyyy/mm/dd and yyyy.mm.dd
+# (day and month may have one digit; one separator throughout).
+DATE_FORMAT_REGEX = re.compile(
+    r'(?P<day>\d{1,2})(?P<sep>[./])(?P<month>\d{1,2})(?P=sep)(?P<year>\d{4})'
+    r'|(?P<year_first>\d{4})(?P<sep_first>[./])(?P<month_first>\d{1,2})(?P=sep_first)(?P<day_first>\d{1,2})'
+)
+
+# Cues before an admission or discharge date, in order of preference
+DATE_CUES = {
+    'admission': [r'תאריך\s*קבלה', r'התקבל\s*ב', r'קבלה'],
+    'discharge': [r'תאריך\s*שחרור', r'שוחרר\s*ב', r'שחרור']
+}
+DATE_REGEX = re.compile(r'\d\d?[./]\d\d?[./]\d{4}')
+# Cue immediately before a date, matched against a short window before it
+DATE_CUE_SUFFIXES = {
+    date_type: [re.compile(rf'{cue}:?\s*$') for cue in cues] for date_type, cues in DATE_CUES.items()
+}
+DATE_CUE_WINDOW = 40
+# Last letters of the cues: a cheap filter before the suffix checks
+DATE_CUE_LAST_LETTERS = frozenset(cue[-1] for cues in DATE_CUES.values() for cue in cues)
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(date_str: str) -> Optional[str]:
+    """Return date_str as dd/mm/yyyy, or None if it is not a valid date."""
+    match = DATE_FORMAT_REGEX.fullmatch(date_str)
+    if not match:
+        return None
+    if match.group('year'):
+        day, month, year = match.group('day', 'month', 'year')
+    else:
+        day, month, year = match.group('day_first', 'month_first', 'year_first')
+    day, month, year = int(day), int(month), int(year)
+    if year < 1 or not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    return f'{day:02d}/{month:02d}/{year:04d}'
 
 def normalize_date(date_str: str) -> str:
-    formats = ['%d/%m/%Y', '%d.%m.%Y', '%Y/%m/%d', '%Y.%m.%d']
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_str, fmt).strftime('%d/%m/%Y')
-        except ValueError:
+    normalized = parse_date(date_str)
+    if normalized is None:
+        raise ValueError('Invalid date format')
+    return normalized
+
+def normalize_dates(date_strs: Iterable[str]) -> pd.Series:
+    """Vectorized normalize_date for bulk processing; invalid dates become 'not_found'."""
+    dates = pd.Series(list(date_strs), dtype=object).astype(str)
+    parts = dates.str.extract(f'^(?:{DATE_FORMAT_REGEX.pattern})$')
+    day_first = parts['year'].notna()
+    parsed = pd.to_datetime(pd.DataFrame({
+        'year': pd.to_numeric(parts['year'].where(day_first, parts['year_first'])),
+        'month': pd.to_numeric(parts['month'].where(day_first, parts['month_first'])),
+        'day': pd.to_numeric(parts['day'].where(day_first, parts['day_first']))
+    }), errors='coerce')
+    return parsed.dt.strftime('%d/%m/%Y').fillna('not_found')
+
+def extract_dates(text: str) -> Tuple[str, str]:
+    """Return the (admission, discharge) dates of text from one scan.
+
+    For each date type the first date after its most preferred cue wins;
+    the first date in the text is the fallback for both. The scan stops
+    early once both types have a valid date for their preferred cue.
+    """
+    first_cued = {}
+    first_date = None
+    for match in DATE_REGEX.finditer(text):
+        date = match.group()
+        if first_date is None:
+            first_date = date
+        cue_end = match.start()
+        while cue_end > 0 and text[cue_end - 1].isspace():
+            cue_end -= 1
+        if cue_end > 0 and text[cue_end - 1] == ':':
+            cue_end -= 1
+        if cue_end == 0 or text[cue_end - 1] not in DATE_CUE_LAST_LETTERS:
             continue
-    raise ValueError('Invalid date format')
+        window_start = max(0, match.start() - DATE_CUE_WINDOW)
+        for date_type, suffixes in DATE_CUE_SUFFIXES.items():
+            for rank, suffix in enumerate(suffixes):
+                if (date_type, rank) not in first_cued and suffix.search(text, window_start, match.start()):
+                    first_cued[(date_type, rank)] = date
+        if all(parse_date(first_cued.get((date_type, 0), '')) for date_type in DATE_CUES):
+            break
+
+    dates = []
+    for date_type, suffixes in DATE_CUE_SUFFIXES.items():
+        found = None
+        for rank in range(len(suffixes)):
+            if (date_type, rank) in first_cued:
+                found = parse_date(first_cued[(date_type, rank)])
+                if found:
+                    break
+        if found is None and first_date is not None:
+            found = parse_date(first_date)
+        dates.append(found or 'not_found')
+    return tuple(dates)
 
 def extract_date(text: str, date_type: str) -> str:
-    # Specific patterns for each date type
-    if date_type == 'admission':
-        patterns = [
-            r'תאריך\s*קבלה:?\s*(\d{1,2}[./]\d{1,2}[./]\d{4})',
-            r'התקבל\s*ב:?\s*(\d{1,2}[./]\d{1,2}[./]\d{4})',
-            r'קבלה:?\s*(\d{1,2}[./]\d{1,2}[./]\d{4})'
-        ]
-    else:  # discharge
-        patterns = [
-            r'תאריך\s*שחרור:?\s*(\d{1,2}[./]\d{1,2}[./]\d{4})',
-            r'שוחרר\s*ב:?\s*(\d{1,2}[./]\d{1,2}[./]\d{4})',
-            r'שחרור:?\s*(\d{1,2}[./]\d{1,2}[./]\d{4})'
-        ]
-
-    # Try specific patterns first
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            try:
-                return normalize_date(match.group(1))
-            except ValueError:
-                continue
-
-    # Generic date pattern as fallback
-    date_pattern = r'(\d{1,2}[./]\d{1,2}[./]\d{4})'
-    dates = re.findall(date_pattern, text)
-    if dates:
-        try:
-            return normalize_date(dates[0])
-        except ValueError:
-            pass
+    admission, discharge = extract_dates(text)
+    return admission if date_type == 'admission' else discharge
 
-    return 'not_found'
 
+def find_sections(text: str) -> Dict[str, List[Tuple[int, int]]]:
+    """Map each detected section name to its (start, end) spans in text."""
+    sections = {}
+    for name, start, end in segmenter.segment(text):
+        sections.setdefault(name, []).append((start, end))
+    return sections
 
+def field_regions(field: str, text: str, sections: Dict[str, List[Tuple[int, int]]]) -> List[Tuple[int, int]]:
+    """Return the spans a field should be searched in, or the full text."""
+    regions = [span for name in FIELD_SECTIONS.get(field, ()) for span in sections.get(name, ())]
+    return regions or [(0, len(text))]
 
-def match_pattern(text: str) -> Dict[str, str]:
+def match_pattern(text: str, sections: Dict[str, List[Tuple[int, int]]] = None) -> Dict[str, str]:
     """
     Extract additional information using regex patterns
     """
     additional_info = {}
+    if sections is None:
+        sections = find_sections(text)
     
-    for field, pattern in FIELD_PATTERNS.items():
-        match = re.search(pattern, text, re.UNICODE)
+    for field, pattern in COMPILED_FIELD_PATTERNS.items():
+        match = None
+        for start, end in field_regions(field, text, sections):
+            match = pattern.search(text, start, end)
+            if match:
+                break
         if match:
             if field in ['admission_date', 'discharge_date']:
                 additional_info[field] = normalize_date(match.group(1).strip())
+            elif field == 'name':
+                additional_info[field] = bound_name(text, match.start(1), match.end(1))
             else:
                 if not match.groups():
                     continue
@@ -160,6 +327,32 @@ def match_pattern(text: str) -> Dict[str, str]:
     return additional_info
 
 
+def bound_name(text: str, start: int, end: int) -> str:
+    """Cut a name capture text[start:end] down to the known names it starts with."""
+    while start < end and text[start].isspace():
+        start += 1
+    runs = name_gazetteer.find_runs(text, start, end, exclude=NAME_STOPWORDS)
+    if runs and runs[0][0] == start:
+        return text[start:runs[0][1]]
+    return text[start:end].strip()
+
+def find_person_names(text: str) -> List[Tuple[int, int]]:
+    """Spans of person names anywhere in text.
+
+    A run of two or more known name tokens (first and last name), at
+    least one of three letters or more, is a name; a single token only
+    when a title or name label precedes it. Runs of two-letter tokens are
+    mostly OCR debris.
+    """
+    names = []
+    for start, end, count in name_gazetteer.find_runs(text, exclude=NAME_STOPWORDS):
+        if NAME_CUE_REGEX.search(text, max(0, start - NAME_CUE_WINDOW), start):
+            names.append((start, end))
+        elif count >= 2 and max(map(len, text[start:end].split())) >= 3:
+            names.append((start, end))
+    return names
+
+
 def get_field_options(field: str) -> List[str]:
     try:
         field_row = params_df[params_df['Field'] == field].iloc[0]
@@ -193,11 +386,18 @@ def validate_fields(entities: Dict[str, str], text: str) -> Dict[str, str]:
         elif 'כסא גלגלים' in text.lower():
             entities['mobility'] = 'כסא גלגלים'
 
-    # FIM score validation
-    if entities.get('fim_score', 'not_found') == 'not_found':
-        fim_matches = re.findall(r'FIM[^0-9]*(\d+)(?:\/126)?', text)
-        if fim_matches:
-            entities['fim_score'] = fim_matches[-1]
+    # FIM and MMSE scores: the stated or computed admission total, else
+    # the score given right after the first FIM mention
+    scores = parse_functional_scores(text)
+    fim_score = scores.fim_total_admission if scores.fim_total_admission is not None else scores.fim_mention
+    if entities.get('fim_score', 'not_found') == 'not_found' and fim_score is not None:
+        entities['fim_score'] = str(fim_score)
+    if scores.fim_motor_admission is not None:
+        entities['fim_motor_score'] = str(scores.fim_motor_admission)
+    if scores.fim_cognitive_admission is not None:
+        entities['fim_cognitive_score'] = str(scores.fim_cognitive_admission)
+    if entities.get('mmse_score', 'not_found') == 'not_found' and scores.mmse is not None:
+        entities['mmse_score'] = str(scores.mmse)
 
     # Living arrangement validation
     if entities.get('living_arrangement', 'not_found') == 'not_found':
@@ -207,41 +407,131 @@ def validate_fields(entities: Dict[str, str], text: str) -> Dict[str, str]:
                 break
 
     # Dates validation
-    if entities.get('admission_date', 'not_found') == 'not_found':
-        entities['admission_date'] = extract_date(text, 'admission')
-    if entities.get('discharge_date', 'not_found') == 'not_found':
-        entities['discharge_date'] = extract_date(text, 'discharge')
+    if 'not_found' in (entities.get('admission_date', 'not_found'), entities.get('discharge_date', 'not_found')):
+        admission, discharge = extract_dates(text)
+        if entities.get('admission_date', 'not_found') == 'not_found':
+            entities['admission_date'] = admission
+        if entities.get('discharge_date', 'not_found') == 'not_found':
+            entities['discharge_date'] = discharge
+
+    return entities
+
+
+def predict_labels(text: str) -> List[Tuple[str, str, float]]:
+    """Label each whitespace-separated word of text with the NER model.
 
+    Returns (word, label, probability) triples. The words are split into
+    windows of NER_WINDOW_WORDS that run through the model as one batch;
+    each word takes the label of its first sub-token.
+    """
+    words = text.split()
+    if not words:
+        return []
+    windows = [words[i:i + NER_WINDOW_WORDS] for i in range(0, len(words), NER_WINDOW_WORDS)]
+    encoding = tokenizer(windows, is_split_into_words=True, truncation=True, padding=True,
+                         max_length=512, return_tensors='pt')
+    autocast = torch.autocast('cpu', dtype=torch.bfloat16) if NER_BF16 else contextlib.nullcontext()
+    with torch.inference_mode(), autocast:
+        probabilities = model(**encoding).logits.float().softmax(dim=-1)
+    scores, predictions = probabilities.max(dim=-1)
+    scores, predictions = scores.tolist(), predictions.tolist()
+
+    labeled = []
+    for window, window_words in enumerate(windows):
+        labels = {}
+        for position, word_id in enumerate(encoding.word_ids(window)):
+            if word_id is not None and word_id not in labels:
+                labels[word_id] = (model.config.id2label[predictions[window][position]],
+                                   scores[window][position])
+        labeled.extend((word, *labels.get(i, ('O', 1.0))) for i, word in enumerate(window_words))
+    return labeled
+
+def predicted_entities(labeled: List[Tuple[str, str, float]]) -> Dict[str, Tuple[str, float]]:
+    """(value, mean probability) of the first B-/I- span of every field reaching NER_CONFIDENCE."""
+    entities = {}
+    field, words, scores = None, [], []
+
+    def close():
+        confidence = sum(scores) / len(scores) if scores else 0.0
+        if field and field not in entities and confidence >= NER_CONFIDENCE:
+            entities[field] = (' '.join(words), confidence)
+
+    for word, label, score in labeled:
+        if label.startswith('I-') and label[2:] == field:
+            words.append(word)
+            scores.append(score)
+            continue
+        close()
+        field, words, scores = None, [], []
+        if label.startswith('B-'):
+            field, words, scores = label[2:], [word], [score]
+    close()
     return entities
 
 
 #def extract_ner_entities(tokens: List[str], labels: List[str], parameters: List[FieldOption]) -> Dict[str, str]:
-def extract_ner_entities(text) -> Dict[str, str]:
+def extract_ner_entities(text, sections: Dict[str, List[Tuple[int, int]]] = None,
+                         verbose: bool = True, known: Dict[str, str] = None) -> Dict[str, str]:
+    """Entities of the nemo_parser patterns, completed by the NER model.
 
-    return validate_documents(text=text)
+    A model prediction is used for fields that neither these patterns nor
+    known (the regex stage's results) found; it replaces a found value
+    only with a mean probability of at least NER_OVERRIDE_CONFIDENCE.
+    """
+    if NER_SECTIONS and sections:
+        spans = sorted(span for name in NER_SECTIONS for span in sections.get(name, ()))
+        if spans:
+            # validate_documents treats every line as its own document
+            text = '\n'.join(text[start:end] for start, end in spans)
+
+    entities = validate_documents(text=text, verbose=verbose, processor=document_processor)
+    found = {field for field, value in {**(known or {}), **entities}.items() if value != 'not_found'}
+    for field, (value, confidence) in predicted_entities(predict_labels(text)).items():
+        if field not in found or confidence >= NER_OVERRIDE_CONFIDENCE:
+            entities[field] = value
+    return entities
     
 
 
-def extract_entities(text: str, parameters: List[FieldOption]) -> Dict[str, str]:
+def extract_entities(text: str, parameters: List[FieldOption], mode: str = 'both',
+                     verbose: bool = True) -> Dict[str, str]:
+    """Extract field values from text.
+
+    mode selects the extractors: 'regex' (patterns and rule checks),
+    'ner' (the NER stage only) or 'both'.
+    """
+    if mode not in ('regex', 'ner', 'both'):
+        raise ValueError(f"Unknown extraction mode: {mode}")
     
     text = normalize_text(text)
+    if deidentifier is not None:
+        text = deidentifier.deidentify(text)
+    sections = find_sections(text)
     
     entities = {}
 
-    # Validate and enhance results
-    entities = validate_fields(entities, text)
-    
-    # Add additional info extraction
-    additional_info = match_pattern(text)
-    entities.update(additional_info)
+    if mode != 'ner':
+        # Validate and enhance results
+        entities = validate_fields(entities, text)
+        
+        # Add additional info extraction
+        additional_info = match_pattern(text, sections)
+        entities.update(additional_info)
+
+        # Person names flagged anywhere in the letter
+        person_names = list(dict.fromkeys(text[start:end] for start, end in find_person_names(text)))
+        if person_names:
+            entities['person_names'] = ', '.join(person_names)
 
-    # NER Processing
-    ner_entities = extract_ner_entities(text)
+    if mode != 'regex':
+        # NER Processing
+        ner_entities = extract_ner_entities(text, sections, verbose=verbose, known=entities)
 
-    entities.update(ner_entities)
+        entities.update(ner_entities)
 
-    # Print ner-entities info as table
-    print_entities(ner_entities)
+        # Print ner-entities info as table
+        if verbose:
+            print_entities(ner_entities)
 
 
     # Fill missing fields with not_found
@@ -2,8 +2,9 @@ from dataclasses import dataclass
 import argparse
 import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Tuple
 import re
+from entity_table import EntityTable, DocumentResult
 
 @dataclass
 class FieldOption:
@@ -11,10 +12,72 @@ class FieldOption:
     field: str
     options: List[str]
 
+# Section headers recognised by SectionSegmenter, keyed by section name.
+# A header only counts when it is followed by a colon.
+DEFAULT_SECTION_HEADERS = {
+    'personal_info': r'פרטים\s*אישיים',
+    'admission_info': r'מקור\s*הפניה',
+    'functional_status': r'מצב\s*תפקודי',
+    'living_situation': r'מצב\s*מגורים',
+    'tests': r'בדיקות\s*(?:בקבלה|עזר)',
+    'physical_exam': r'בדיקה\s*גופנית',
+    'diagnoses': r'אבחנות(?:\s*עיקריות)?',
+    'medications': r'טיפול\s*תרופתי',
+    'hospitalization_summary': r'סיכום\s*מהלך\s*האשפוז',
+    'discharge_status': r'מצב\s*בשחרור',
+    'recommendations': r'המלצות'
+}
+
+class SectionSegmenter:
+    """Split a document into sections with a single scan over all headers."""
+
+    def __init__(self, headers: Dict[str, str] = None):
+        self.headers = dict(headers or DEFAULT_SECTION_HEADERS)
+        self._names = list(self.headers)
+        alternation = '|'.join(
+            f'(?P<s{i}>{pattern})' for i, pattern in enumerate(self.headers.values())
+        )
+        self._regex = re.compile(rf'(?<![א-ת])(?:{alternation})\s*:')
+
+    def segment(self, text: str) -> List[Tuple[str, int, int]]:
+        """Return (name, start, end) offsets of every section body in text.
+
+        A section body runs from its header to the next recognised header
+        (or the end of the text), without surrounding whitespace.
+        """
+        headers = [
+            (self._names[int(match.lastgroup[1:])], match.start(), match.end())
+            for match in self._regex.finditer(text)
+        ]
+        spans = []
+        for i, (name, _, start) in enumerate(headers):
+            end = headers[i + 1][1] if i + 1 < len(headers) else len(text)
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            spans.append((name, start, end))
+        return spans
+
+    def first_spans(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """Return the first (start, end) span found for each section name."""
+        sections = {}
+        for name, start, end in self.segment(text):
+            sections.setdefault(name, (start, end))
+        return sections
+
 class DocumentProcessor:
-    def __init__(self, model_path: str, confidence_threshold: float = 0.7):
+    def __init__(
+        self,
+        model_path: str,
+        confidence_threshold: float = 0.7,
+        section_headers: Dict[str, str] = None,
+        table: EntityTable = None
+    ):
         self.model_path = model_path
         self.confidence_threshold = confidence_threshold
+        self.segmenter = SectionSegmenter(section_headers)
+        self.table = table if table is not None else EntityTable()
         self._setup_patterns()
 
     def _setup_patterns(self):
@@ -30,51 +93,40 @@ class DocumentProcessor:
             'mmse_score': r'MMSE:?\s*(\d+)(?:/30)?'
         }
 
-    def process_document(self, text: str) -> Dict[str, Any]:
-        """Process a document and extract information."""
+    def process_document(self, text: str, doc_id: int = None) -> DocumentResult:
+        """Process a document and extract information.
+
+        doc_id refers to a document already in self.table; when omitted the
+        text is registered as a new document.
+        """
         try:
-            return {
-                'entities': self._extract_entities(text),
-                'sections': self._extract_sections(text),
-                'original_text': text
-            }
+            if doc_id is None:
+                doc_id = self.table.add_document(text)
+            first = len(self.table)
+            self._extract_entities(text, doc_id)
+            return DocumentResult(
+                self.table, doc_id, first, len(self.table), self._extract_sections(text)
+            )
         except Exception as e:
             logging.error(f"Error processing document: {str(e)}")
             raise
 
-    def _extract_entities(self, text: str) -> List[Dict[str, Any]]:
-        """Extract entities from text using patterns."""
-        entities = []
+    def _extract_entities(self, text: str, doc_id: int):
+        """Extract entities from text using patterns into self.table."""
         for field, pattern in self.PATTERNS.items():
             matches = re.finditer(pattern, text)
             for match in matches:
-                entity_text = match.group(1) if len(match.groups()) > 0 else match.group(0)
-                entities.append({
-                    'text': entity_text,
-                    'label': field,
-                    'confidence': 1.0,  # Pattern matches get high confidence
-                    'start': match.start(),
-                    'end': match.end()
-                })
-        return entities
-
-    def _extract_sections(self, text: str) -> Dict[str, str]:
-        """Extract document sections."""
-        sections = {}
-        section_patterns = {
-            'personal_info': r'פרטים\s*אישיים:(.*?)(?:מקור|$)',
-            'admission_info': r'מקור\s*הפניה:(.*?)(?:מצב|$)',
-            'physical_exam': r'בדיקה\s*גופנית:(.*?)(?:אבחנות|$)',
-            'diagnoses': r'אבחנות:(.*?)(?:המלצות|$)',
-            'recommendations': r'המלצות:(.*?)(?:$)'
-        }
+                group = 1 if len(match.groups()) > 0 else 0
+                self.table.add(
+                    doc_id, field, match.start(), match.end(),
+                    match.start(group), match.end(group),
+                    confidence=1.0,  # Pattern matches get high confidence
+                    document=text
+                )
 
-        for section, pattern in section_patterns.items():
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                sections[section] = match.group(1).strip()
-
-        return sections
+    def _extract_sections(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """Extract document sections as (start, end) offsets into text."""
+        return self.segmenter.first_spans(text)
 
 def setup_logging():
     logging.basicConfig(
@@ -92,24 +144,24 @@ def read_file(file_path: str) -> List[str]:
     with open(file_path, 'r', encoding='utf-8') as f:
         return [line.strip() for line in f if line.strip()]
 
-def save_results(results: List[Dict], output_file: str):
+def save_results(results: List[DocumentResult], output_file: str):
     """Save results to JSON file."""
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+        json.dump([result.to_dict() for result in results], f, ensure_ascii=False, indent=2)
 
-def print_entity_stats(results: List[Dict[str, Any]]):
+def print_entity_stats(results: List[DocumentResult]):
     """Print statistics about extracted entities."""
     entity_counts = {}
     confidence_sums = {}
     
     for doc in results:
-        for entity in doc['entities']:
-            label = entity['label']
+        for entity in doc.entities:
+            label = entity.label
             if label not in entity_counts:
                 entity_counts[label] = 0
                 confidence_sums[label] = 0
             entity_counts[label] += 1
-            confidence_sums[label] += entity['confidence']
+            confidence_sums[label] += entity.confidence
     
     print("\nEntity Statistics:")
     print("=" * 60)
@@ -121,12 +173,12 @@ def print_entity_stats(results: List[Dict[str, Any]]):
         avg_conf = confidence_sums[label] / count
         print(f"{label:<25} {count:<8} {avg_conf:.4f}")
 
-def print_section_stats(results: List[Dict[str, Any]]):
+def print_section_stats(results: List[DocumentResult]):
     """Print statistics about extracted sections."""
     section_counts = {}
     
     for doc in results:
-        for section in doc['sections'].keys():
+        for section in doc.sections.keys():
             section_counts[section] = section_counts.get(section, 0) + 1
     
     print("\nSection Statistics:")
@@ -141,58 +193,79 @@ def validate_documents(
     model_path: str = 'hebrew-medical-ner-final',
     input_file: str = '',
     output_file: str = "validation_results.json",
-    text: str = 'empty',
-    confidence_threshold: float = 0.7
+    text: str = None,
+    confidence_threshold: float = 0.7,
+    verbose: bool = True,
+    processor: DocumentProcessor = None
 ):
-    """Run validation on documents."""
+    """Run validation on documents and return the last value of each entity.
+
+    Documents are the lines of text or, when text is None, of input_file;
+    only file input is saved to output_file. A processor can be passed in
+    to be reused across calls; it gets a fresh EntityTable every call.
+    With verbose=False nothing is printed.
+    """
     # Initialize processor
-    processor = DocumentProcessor(
-        model_path=model_path,
-        confidence_threshold=confidence_threshold
-    )
+    table = EntityTable()
+    if processor is None:
+        processor = DocumentProcessor(
+            model_path=model_path,
+            confidence_threshold=confidence_threshold,
+            table=table
+        )
+    else:
+        processor.table = table
     
     # Read input texts
-    if(len(text) > 0):
+    if text is not None:
+        if not text:
+            raise Exception('The text is empty')
         texts = read_text(text)
     else:
-        raise Exception('The text is empty')
-    
         logging.info(f"Reading texts from {input_file}")
-        texts = read_file(input_file)    
+        texts = read_file(input_file)
     logging.info(f"Found {len(texts)} texts to process")
     
     # Process each text
     results = []
     entities = {}
-    for i, text in enumerate(texts, 1):
+    for i, text_line in enumerate(texts, 1):
         logging.info(f"Processing text {i}/{len(texts)}")
         try:
-            result = processor.process_document(text)
+            result = processor.process_document(text_line)
+            for entity in result.entities:
+                entities[entity.label] = entity.text
+            results.append(result)
+            if not verbose:
+                continue
+            
             print(f"\nDocument {i}:")
             print("=" * 80)
             print("\nExtracted Entities:")
-            for entity in result['entities']:
-                print(f"  • {entity['label']}: '{entity['text']}' "
-                      f"(confidence: {entity['confidence']:.4f})")
-                entities[entity['label']] = entity['text']
+            for entity in result.entities:
+                print(f"  • {entity.label}: '{entity.text}' "
+                      f"(confidence: {entity.confidence:.4f})")
             
-            if result['sections']:
+            if result.sections:
                 print("\nExtracted Sections:")
-                for section, content in result['sections'].items():
+                for section, (start, end) in result.sections.items():
                     print(f"\n{section}:")
-                    print(content[:200] + "..." if len(content) > 200 else content)
-            
-            results.append(result)
+                    if end - start > 200:
+                        print(text_line[start:start + 200] + "...")
+                    else:
+                        print(text_line[start:end])
             
         except Exception as e:
             logging.error(f"Error processing document {i}: {str(e)}")
             continue
     
-    print_entity_stats(results)
-    print_section_stats(results)
+    if verbose:
+        print_entity_stats(results)
+        print_section_stats(results)
     
-    save_results(results, output_file)
-    logging.info(f"Results saved to {output_file}")
+    if text is None:
+        save_results(results, output_file)
+        logging.info(f"Results saved to {output_file}")
     
     return entities
 
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The trainer modules import each other as top-level modules
+sys.path.insert(0, os.path.join(ROOT, 'trainer'))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,24 @@
+import os
+import pytest
+from transformers import BertTokenizerFast
+from conftest import ROOT
+import trainer
+from trainer import encoding_cache_key, generation_cache_key
+
+@pytest.fixture(autouse=True)
+def trainer_dir(monkeypatch):
+    monkeypatch.chdir(os.path.join(ROOT, 'trainer'))
+
+def test_encoding_key_depends_on_label_ids():
+    tokenizer = BertTokenizerFast(vocab={'[PAD]': 0, '[UNK]': 1, '[CLS]': 2, '[SEP]': 3})
+    first = encoding_cache_key('g', tokenizer, {'O': 0, 'B-age': 1}, 256)
+    second = encoding_cache_key('g', tokenizer, {'B-age': 0, 'O': 1}, 256)
+    assert first != second
+
+def test_generation_key_depends_on_generator_code(tmp_path, monkeypatch):
+    before = generation_cache_key(42, 100, 100)
+    source = tmp_path / 'data_generator.py'
+    source.write_text(open(trainer.data_generator.__file__, encoding='utf-8').read() + '\n# changed\n',
+                      encoding='utf-8')
+    monkeypatch.setattr(trainer.data_generator, '__file__', str(source))
+    assert generation_cache_key(42, 100, 100) != before
@@ -0,0 +1,40 @@
+import os
+import random
+import pytest
+from conftest import ROOT
+from data_generator import (
+    example_digest, iter_training_examples, iter_unique_examples, generate_sharded, read_examples
+)
+
+@pytest.fixture(autouse=True)
+def trainer_dir(monkeypatch):
+    monkeypatch.chdir(os.path.join(ROOT, 'trainer'))
+
+def test_iter_training_examples_is_deduplicated():
+    digests = [example_digest(example) for example in iter_training_examples(500, seed=3)]
+    assert len(digests) == 500
+    assert len(set(digests)) == len(digests)
+
+def test_iter_training_examples_is_reproducible():
+    first = [example['text'] for example in iter_training_examples(20, seed=5)]
+    second = [example['text'] for example in iter_training_examples(20, seed=5)]
+    assert first == second
+
+def test_iter_training_examples_skips_excluded():
+    excluded = frozenset(example_digest(example) for example in iter_training_examples(200, seed=7))
+    digests = [example_digest(example) for example in iter_training_examples(2000, seed=8, exclude=excluded)]
+    assert excluded.isdisjoint(digests)
+
+def test_windowed_dedupe_keeps_memory_bounded():
+    examples = iter_unique_examples(random.Random(3), window=50)
+    for _ in range(500):
+        next(examples)
+    assert len(examples.gi_frame.f_locals['seen']) <= 50
+
+def test_sharded_generation_is_unique_across_shards(tmp_path):
+    merged = generate_sharded(3000, 2, str(tmp_path), seed=0, workers=2)
+
+    digests = [example_digest(example)
+               for shard in range(2)
+               for example in read_examples(str(tmp_path / f"shard-{shard:05d}.jsonl"))]
+    assert len(set(digests)) == len(digests) == merged['examples']
@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import pytest
+from conftest import ROOT
+import deidentify
+from deidentify import Deidentifier
+from field_patterns import name_stopwords
+
+needs_model = pytest.mark.skipif(
+    not os.path.isdir(os.path.join(ROOT, 'hebrew-medical-ner-final')),
+    reason='needs the trained model in hebrew-medical-ner-final'
+)
+
+CLINICAL_WORDS = ('שואה', 'קומה', 'לבוש', 'אכילה', 'ימין', 'ביום', 'סיעוד')
+
+@pytest.fixture(scope='module')
+def stopwords():
+    return name_stopwords(os.path.join(ROOT, 'transformed_parameters.csv'))
+
+def test_clinical_words_are_not_names(stopwords):
+    deidentifier = Deidentifier(key='test', exclude=stopwords)
+    for word in CLINICAL_WORDS:
+        assert not deidentifier.is_name(word)
+
+def test_names_and_ids_get_stable_pseudonyms(stopwords):
+    deidentifier = Deidentifier(key='test', exclude=stopwords)
+    text = 'שם: משה כהן ת.ז. 123456789 תאריך קבלה: 01.02.2025'
+    result = deidentifier.deidentify(text)
+
+    assert 'משה' not in result and '123456789' not in result
+    assert result.startswith('שם: NAME_') and ' ת.ז. ID_' in result
+    assert result.endswith('תאריך קבלה: 01.02.2025')
+    assert Deidentifier(key='test', exclude=stopwords).deidentify(text) == result
+    assert Deidentifier(key='other', exclude=stopwords).deidentify(text) != result
+
+def test_date_shift_is_opt_in():
+    shifted = Deidentifier(key='test', shift_dates=True).deidentify('01.02.2025 עד 15.02.2025')
+    assert '01.02.2025' not in shifted and len(shifted) == len('01.02.2025 עד 15.02.2025')
+
+def test_cli_keeps_clinical_words(monkeypatch, capsys):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(sys, 'argv', ['deidentify.py'])
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(' '.join(CLINICAL_WORDS) + ' משה כהן\n'))
+    deidentify.main()
+
+    output = capsys.readouterr().out
+    assert output.startswith(' '.join(CLINICAL_WORDS) + ' NAME_')
+
+@pytest.fixture(scope='module')
+def extractor():
+    import gold_eval
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(ROOT)
+        monkeypatch.setenv('NER_DEIDENTIFY', '1')
+        monkeypatch.delenv('DEID_SHIFT_DATES', raising=False)
+        yield gold_eval.load_extractor()
+
+@pytest.fixture(scope='module')
+def sample_form():
+    import gold_eval
+    return gold_eval.load_texts(os.path.join(ROOT, 'results', 'ocr_text.csv'))['sample_form.pdf']
+
+@needs_model
+def test_field_labels_survive_deidentification(extractor, sample_form):
+    text = extractor.deidentifier.deidentify(extractor.normalize_text(sample_form))
+    for label in ('קומה', 'שואה', 'לבוש', 'אכילה', 'מעלית', 'השכלה'):
+        assert label in text
+    assert '01.02.2025' in text
+
+@needs_model
+def test_sample_form_fields_with_deidentification(extractor, sample_form):
+    parameters = [extractor.FieldOption(field=field, options=[])
+                  for field in ('floor_number', 'admission_date', 'discharge_date')]
+    entities = extractor.extract_entities(sample_form, parameters, mode='regex', verbose=False)
+    assert entities['floor_number'] == '2'
+    assert entities['admission_date'] == '01/02/2025'
+    assert entities['discharge_date'] == '15/02/2025'
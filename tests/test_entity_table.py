@@ -0,0 +1,14 @@
+from entity_table import EntityTable
+from nemo_parser import DocumentProcessor
+
+TEXT = 'שם: ישראל ישראלי ת.ז. 123456789 תאריך קבלה: 01/02/2025 FIM: 60/126'
+
+
+def test_slices_match_kept_documents():
+    kept = DocumentProcessor('', table=EntityTable()).process_document(TEXT)
+    sliced = DocumentProcessor('', table=EntityTable(keep_documents=False)).process_document(TEXT)
+
+    assert sliced.table.documents is None and sliced.text is None
+    assert kept.text == TEXT
+    assert sliced.to_dict() == kept.to_dict()
+    assert {e.label: e.text for e in sliced.entities}['patient_id'] == '123456789'
@@ -0,0 +1,28 @@
+import os
+import pytest
+from conftest import ROOT
+
+needs_model = pytest.mark.skipif(
+    not os.path.isdir(os.path.join(ROOT, 'hebrew-medical-ner-final')),
+    reason='needs the trained model in hebrew-medical-ner-final'
+)
+
+@pytest.fixture(scope='module')
+def extractor():
+    import gold_eval
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(ROOT)
+        yield gold_eval.load_extractor()
+
+@needs_model
+def test_predictions_keep_found_values(extractor, monkeypatch):
+    labeled = [('1', 'B-floor_number', 0.8), ('60', 'B-fim_score', 0.99),
+               ('3', 'B-bed_number', 0.8), ('ב', 'B-age', 0.5)]
+    monkeypatch.setattr(extractor, 'predict_labels', lambda text: labeled)
+    monkeypatch.setattr(extractor, 'validate_documents', lambda **kwargs: {'fim_score': '50'})
+
+    entities = extractor.extract_ner_entities('text', verbose=False,
+                                              known={'floor_number': '2', 'bed_number': 'not_found'})
+
+    # Found values give way only to predictions reaching NER_OVERRIDE_CONFIDENCE
+    assert entities == {'fim_score': '60', 'bed_number': '3'}
@@ -0,0 +1,72 @@
+import csv
+import os
+import numpy as np
+import pytest
+from conftest import ROOT
+from functional_scores import FIM_ITEMS, fim_subscores, parse_functional_scores, scan_fim_table
+
+ITEM = {item: i for i, (item, _, _) in enumerate(FIM_ITEMS)}
+
+def shipped_text(export: str, filename: str) -> str:
+    """Pages of filename in a results/ export, whitespace-normalized like the extractor."""
+    with open(os.path.join(ROOT, 'results', export), encoding='utf-8') as f:
+        pages = [row[-1] for row in csv.reader(f) if row[0] == filename]
+    return ' '.join('\n'.join(pages).replace('‎', ' ').replace('‏', ' ').split())
+
+def read_items(items: np.ndarray) -> dict:
+    return {FIM_ITEMS[i][0]: tuple(int(v) for v in items[i]) for i in range(len(FIM_ITEMS)) if items[i, 0] >= 0}
+
+def test_scan_reads_pdf_table():
+    items, totals, fim_mention, mmse = scan_fim_table(shipped_text('searchable_text.csv', 'discharge-letter.pdf'))
+
+    # The eating label is redacted in this export, so 16 of 17 rows are read
+    assert read_items(items) == {
+        'grooming': (3, 5), 'bathing': (3, 5), 'dressing_upper': (3, 5), 'dressing_lower': (2, 4),
+        'bladder': (4, 6), 'bowel': (4, 6), 'transfer_bed': (3, 5), 'transfer_toilet': (3, 5),
+        'transfer_tub': (2, 4), 'locomotion': (2, 4), 'stairs': (1, 3),
+        'comprehension': (6, 7), 'expression': (5, 6), 'social_interaction': (5, 6),
+        'problem_solving': (5, 6), 'memory': (5, 6),
+    }
+    assert totals == [60, 88]
+    # 'FIM' in the prose is followed by no score, not by the '50 מטר' further on
+    assert fim_mention is None
+    assert mmse is None
+
+def test_scan_reads_ocr_table():
+    items, totals, fim_mention, _ = scan_fim_table(shipped_text('ocr_text.csv', 'discharge-letter.pdf'))
+
+    # OCR drops the slash of most scores ('47' for '4/7'); only intact rows are read
+    assert read_items(items) == {
+        'transfer_toilet': (3, 5), 'expression': (5, 6), 'social_interaction': (5, 6),
+    }
+    assert totals == [60, 88]
+    assert fim_mention is None
+
+@pytest.mark.parametrize('export', ['searchable_text.csv', 'ocr_text.csv'])
+def test_scan_reads_single_scores(export):
+    items, totals, fim_mention, mmse = scan_fim_table(shipped_text(export, 'sample_form.pdf'))
+
+    assert (items < 0).all()
+    assert totals == []
+    assert fim_mention == 5
+    assert mmse == 29
+
+def test_subscores_of_shipped_letter():
+    scores = parse_functional_scores(shipped_text('searchable_text.csv', 'discharge-letter.pdf'))
+
+    assert (scores.fim_cognitive_admission, scores.fim_cognitive_discharge) == (26, 31)
+    assert scores.fim_motor_admission is None
+    assert (scores.fim_total_admission, scores.fim_total_discharge) == (60, 88)
+
+def test_fim_subscores():
+    items = np.full((2, len(FIM_ITEMS), 2), 7, dtype=np.int8)
+    items[0, ITEM['memory']] = (3, 5)
+    items[1, ITEM['eating'], 0] = -1
+
+    motor, cognitive, total = fim_subscores(items)
+
+    assert motor[0].tolist() == [84, 84]
+    assert cognitive[0].tolist() == [31, 33]
+    assert total[0].tolist() == [115, 117]
+    assert np.isnan(motor[1, 0]) and motor[1, 1] == 84
+    assert np.isnan(total[1, 0]) and cognitive[1, 0] == 35
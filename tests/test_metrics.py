@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from trainer import span_metrics
+
+ID2LABEL = {0: 'O', 1: 'B-age', 2: 'I-age', 3: 'B-name', 4: 'I-name'}
+LABEL2ID = {label: i for i, label in ID2LABEL.items()}
+LENGTH = 8
+
+def encode(true_sentences, pred_sentences):
+    """[N, LENGTH] id arrays laid out like the Trainer's: -100 on [CLS], on
+    the second sub-token of the first word and on padding. Predictions at
+    those positions are junk entity labels, which must be ignored."""
+    labels = np.full((len(true_sentences), LENGTH), -100)
+    predictions = np.full((len(true_sentences), LENGTH), LABEL2ID['I-name'])
+    for row, (true, pred) in enumerate(zip(true_sentences, pred_sentences)):
+        positions = [1] + list(range(3, 3 + len(true) - 1))
+        for position, true_label, pred_label in zip(positions, true, pred):
+            labels[row, position] = LABEL2ID[true_label]
+            predictions[row, position] = LABEL2ID[pred_label]
+    return predictions, labels
+
+# Expected values were produced by seqeval 1.2.2 (default mode, IOB2):
+# (precision, recall, f1) overall and per entity type present
+CASES = {
+    'i_without_b': (
+        [['B-age', 'I-age', 'O', 'O']],
+        [['I-age', 'I-age', 'O', 'O']],
+        (1.0, 1.0, 1.0), {'age': (1.0, 1.0, 1.0)}
+    ),
+    'type_switch': (
+        [['B-age', 'I-age', 'O', 'B-name', 'I-name']],
+        [['B-age', 'I-name', 'O', 'B-name', 'I-name']],
+        (1 / 3, 0.5, 0.4), {'age': (0.0, 0.0, 0.0), 'name': (0.5, 1.0, 2 / 3)}
+    ),
+    'mixed': (
+        [['O', 'B-name', 'I-name', 'B-age', 'O'], ['I-age', 'O', 'B-name']],
+        [['O', 'B-name', 'I-name', 'B-age', 'I-age'], ['I-age', 'I-age', 'B-name']],
+        (0.5, 0.5, 0.5), {'age': (0.0, 0.0, 0.0), 'name': (1.0, 1.0, 1.0)}
+    ),
+    'across_sentences': (
+        [['O', 'B-age'], ['I-age', 'O']],
+        [['O', 'B-age'], ['B-age', 'O']],
+        (1.0, 1.0, 1.0), {'age': (1.0, 1.0, 1.0)}
+    ),
+}
+
+@pytest.mark.parametrize('case', CASES)
+def test_span_metrics_match_seqeval(case):
+    true, pred, overall, per_entity = CASES[case]
+
+    metrics = span_metrics(*encode(true, pred), ID2LABEL)
+
+    assert (metrics['precision'], metrics['recall'], metrics['f1']) == pytest.approx(overall)
+    for entity, expected in per_entity.items():
+        scores = metrics['per_entity'][entity]
+        assert (scores['precision'], scores['recall'], scores['f1']) == pytest.approx(expected)
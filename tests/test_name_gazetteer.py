@@ -0,0 +1,33 @@
+import os
+import pytest
+import name_gazetteer
+from name_gazetteer import NameGazetteer
+
+@pytest.fixture
+def names_file(tmp_path):
+    path = tmp_path / 'source' / 'names.csv'
+    path.parent.mkdir()
+    path.write_text('\ufeffמשה\nכהן\nלוי\n', encoding='utf-8')
+    return path
+
+def test_load_builds_into_cache_dir(names_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(name_gazetteer, 'CACHE_DIR', str(tmp_path / 'cache'))
+    trie_file = names_file.with_suffix('.trie')
+
+    gazetteer = NameGazetteer.load(str(trie_file), str(names_file))
+
+    assert 'משה' in gazetteer and 'דוד' not in gazetteer
+    assert not trie_file.exists()
+    assert sorted(os.listdir(names_file.parent)) == ['names.csv']
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+    assert 'כהן' in NameGazetteer.load(str(trie_file), str(names_file))
+
+def test_load_falls_back_to_memory(names_file, tmp_path, monkeypatch):
+    blocker = tmp_path / 'not-a-dir'
+    blocker.write_text('')
+    monkeypatch.setattr(name_gazetteer, 'CACHE_DIR', str(blocker / 'cache'))
+
+    gazetteer = NameGazetteer.load(str(names_file.with_suffix('.trie')), str(names_file))
+
+    assert 'לוי' in gazetteer
+    assert sorted(os.listdir(names_file.parent)) == ['names.csv']
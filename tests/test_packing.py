@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+import pytest
+import torch
+from transformers import BertConfig, BertForTokenClassification
+from trainer import PackedDataCollator
+
+def tiny_model(attn_implementation: str) -> BertForTokenClassification:
+    config = BertConfig(
+        vocab_size=50,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=64,
+        num_labels=3
+    )
+    config._attn_implementation = attn_implementation
+    torch.manual_seed(0)
+    return BertForTokenClassification(config).eval()
+
+@pytest.mark.parametrize('attn_implementation', ['sdpa', 'eager'])
+def test_packed_forward_matches_unpacked(attn_implementation):
+    model = tiny_model(attn_implementation)
+    segments = [[2, 7, 9, 11, 3], [2, 5, 6, 3], [2, 8, 12, 13, 14, 15, 3]]
+    features = [
+        {
+            'input_ids': segments[0] + segments[1],
+            'labels': [0] * 9,
+            'position_ids': list(range(5)) + list(range(4))
+        },
+        {
+            'input_ids': segments[2],
+            'labels': [0] * 7,
+            'position_ids': list(range(7))
+        }
+    ]
+    batch = PackedDataCollator(SimpleNamespace(pad_token_id=0), dtype=model.dtype)(features)
+    assert batch['attention_mask'].shape == (2, 1, 16, 16)
+
+    with torch.no_grad():
+        packed = model(
+            input_ids=batch['input_ids'],
+            position_ids=batch['position_ids'],
+            attention_mask=batch['attention_mask']
+        ).logits
+        unpacked = [model(input_ids=torch.tensor([segment])).logits[0] for segment in segments]
+
+    torch.testing.assert_close(packed[0, :5], unpacked[0], atol=1e-5, rtol=1e-4)
+    torch.testing.assert_close(packed[0, 5:9], unpacked[1], atol=1e-5, rtol=1e-4)
+    torch.testing.assert_close(packed[1, :7], unpacked[2], atol=1e-5, rtol=1e-4)
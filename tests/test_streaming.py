@@ -0,0 +1,36 @@
+import os
+import itertools
+import string
+from transformers import BertTokenizerFast
+from conftest import ROOT
+from data_generator import load_parameters
+from trainer import get_labels, prepare_streaming_datasets
+
+def tiny_tokenizer() -> BertTokenizerFast:
+    chars = [chr(c) for c in range(ord('א'), ord('ת') + 1)] + list(string.digits + string.ascii_letters + string.punctuation)
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars + ['##' + c for c in chars]
+    return BertTokenizerFast(vocab={token: i for i, token in enumerate(vocab)})
+
+def test_streamed_rows_have_labels(monkeypatch):
+    monkeypatch.chdir(os.path.join(ROOT, 'trainer'))
+    label2id = {label: i for i, label in get_labels(load_parameters()).items()}
+    _, eval_stream = prepare_streaming_datasets(
+        tiny_tokenizer(), label2id, seed=1, eval_examples=4, batch_size=2
+    )
+
+    rows = list(eval_stream)
+    assert len(rows) == 4
+    for row in rows:
+        assert 'tokens' not in row
+        assert len(row['labels']) == len(row['input_ids'])
+
+def test_training_stream_skips_eval_examples(monkeypatch):
+    monkeypatch.chdir(os.path.join(ROOT, 'trainer'))
+    label2id = {label: i for i, label in get_labels(load_parameters()).items()}
+    train_stream, eval_stream = prepare_streaming_datasets(
+        tiny_tokenizer(), label2id, seed=1, eval_examples=1000, batch_size=100
+    )
+
+    held_out = {tuple(row['input_ids']) for row in eval_stream}
+    seen = [tuple(row['input_ids']) for row in itertools.islice(train_stream, 2000)]
+    assert held_out.isdisjoint(seen)
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+import pytest
+from sweep import MedianPruningCallback
+
+def evaluate(callback, step, batch_size, value, max_steps=1000):
+    args = SimpleNamespace(per_device_train_batch_size=batch_size, gradient_accumulation_steps=1, world_size=1)
+    state = SimpleNamespace(global_step=step, max_steps=max_steps)
+    control = SimpleNamespace(should_training_stop=False)
+    callback.on_evaluate(args, state, control, metrics={'eval_f1': value})
+    return control.should_training_stop
+
+@pytest.fixture
+def peers(tmp_path):
+    # eval_every=100 with batch sizes 16 and 32 gives steps 6 (96 examples) and 3 (96)
+    for trial in (0, 1):
+        evaluate(MedianPruningCallback(str(tmp_path), trial, eval_every=100), 3, 32, 0.8)
+    return tmp_path
+
+def test_prunes_below_median_of_rounded_point(peers):
+    callback = MedianPruningCallback(str(peers), 2, eval_every=100)
+    assert evaluate(callback, 6, 16, 0.5)
+    assert callback.pruned
+
+def test_ignores_evaluations_after_training(peers):
+    callback = MedianPruningCallback(str(peers), 2, eval_every=100)
+    assert not evaluate(callback, 6, 16, 0.5, max_steps=6)
+
+    callback.on_train_end(None, None, None)
+    assert not evaluate(callback, 3, 32, 0.5)
+    assert not callback.pruned
+    assert len(list(peers.iterdir())) == 2
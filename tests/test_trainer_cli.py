@@ -0,0 +1,20 @@
+import sys
+import pytest
+import trainer
+
+def run_main(monkeypatch, *argv) -> dict:
+    calls = {}
+    for mode in ('train', 'distill', 'fine_tune'):
+        monkeypatch.setattr(trainer, mode, lambda mode=mode, **kwargs: calls.update({mode: kwargs}))
+    monkeypatch.setattr(sys, 'argv', ['trainer.py', *argv])
+    trainer.main()
+    return calls
+
+def test_warm_start_keeps_fine_tune_defaults(monkeypatch):
+    kwargs = run_main(monkeypatch, '--warm_start', 'base', '--new_data', 'new.jsonl')['fine_tune']
+    assert 'num_train_epochs' not in kwargs and 'learning_rate' not in kwargs
+
+@pytest.mark.parametrize('mode, argv', [('train', []), ('fine_tune', ['--warm_start', 'base'])])
+def test_explicit_values_are_forwarded(monkeypatch, mode, argv):
+    kwargs = run_main(monkeypatch, *argv, '--epochs', '3', '--learning_rate', '1e-5')[mode]
+    assert (kwargs['num_train_epochs'], kwargs['learning_rate']) == (3, 1e-5)
@@ -1,14 +1,25 @@
 import pandas as pd
 import random
 import datetime
-from typing import Dict, List, Any, Tuple
-from collections import defaultdict
+from typing import Dict, List, Any, Tuple, Optional, Iterator, FrozenSet
+from collections import defaultdict, deque
 import os
+import json
+import hashlib
+import multiprocessing
+import re
+import string
+
+PARAMETERS_FILE = '../transformed_parameters.csv'
+
+# Reference date for generated date variations, fixed so that a seed fully
+# determines the generated examples.
+REFERENCE_DATE = datetime.datetime(2025, 2, 15)
 
 def load_parameters():
     """Load and validate the parameters from CSV."""
     try:
-        df = pd.read_csv('../transformed_parameters.csv')
+        df = pd.read_csv(PARAMETERS_FILE)
         print(f"Loaded {len(df)} parameters from CSV")
         return df
     except Exception as e:
@@ -192,67 +203,76 @@ def create_medical_document_templates() -> List[str]:
         FIM: {fim_score}"""
     ]
 
-def create_bio_labels(tokens: List[str], value: str, field: str) -> List[str]:
-    """Create BIO scheme labels for tokens."""
-    labels = ["O"] * len(tokens)
-    value_tokens = value.split()
-    
-    # Convert to lowercase for case-insensitive matching
-    token_text = " ".join(tokens).lower()
-    value_text = " ".join(value_tokens).lower()
-    
-    # Find all occurrences
-    start_idx = 0
-    while True:
-        try:
-            pos = token_text.index(value_text, start_idx)
-            token_start = len(token_text[:pos].split())
-            
-            if token_start < len(tokens):
-                labels[token_start] = f"B-{field}"
-                for i in range(token_start + 1, min(token_start + len(value_tokens), len(tokens))):
-                    labels[i] = f"I-{field}"
-            
-            start_idx = pos + 1
-        except ValueError:
-            break
-    
-    return labels
+TOKEN_PATTERN = re.compile(r'\S+')
 
-def create_training_examples(min_examples: int = 10) -> List[Dict[str, Any]]:
-    """Generate diverse training examples."""
-    examples = []
+def parse_template(template: str) -> List[Tuple[str, Optional[str]]]:
+    """Split a template into (literal_text, field_name) pieces."""
+    return [(literal, field) for literal, field, _, _ in string.Formatter().parse(template)]
+
+def render_template(pieces: List[Tuple[str, Optional[str]]],
+                    field_values: Dict[str, str]) -> Tuple[str, List[Tuple[str, int, int]]]:
+    """Fill a parsed template and record the (field, start, end) span of each value."""
+    parts = []
+    spans = []
+    position = 0
+    for literal, field in pieces:
+        parts.append(literal)
+        position += len(literal)
+        if field is not None:
+            value = field_values[field]
+            parts.append(value)
+            spans.append((field, position, position + len(value)))
+            position += len(value)
+    return "".join(parts), spans
+
+def create_bio_labels(text: str, spans: List[Tuple[str, int, int]]) -> Tuple[List[str], List[str]]:
+    """Split text on whitespace and label tokens from ordered value spans.
+
+    A token overlapping a span is labelled with its field: B- for the first
+    token of the span, I- for the rest. Runs in one pass over the text.
+    """
+    tokens = []
+    labels = []
+    span_index = 0
+    labelled_span = -1
+    for match in TOKEN_PATTERN.finditer(text):
+        start, end = match.span()
+        while span_index < len(spans) and spans[span_index][2] <= start:
+            span_index += 1
+        label = "O"
+        if span_index < len(spans) and spans[span_index][1] < end:
+            prefix = "I-" if labelled_span == span_index else "B-"
+            label = prefix + spans[span_index][0]
+            labelled_span = span_index
+        tokens.append(match.group())
+        labels.append(label)
+    return tokens, labels
+
+def generate_example_round(rng: random.Random) -> Iterator[Dict[str, Any]]:
+    """Yield one round of examples: 50 per document template plus date variations."""
     realistic_values = create_realistic_values()
     document_templates = create_medical_document_templates()
     
     # Generate examples from medical document templates
     for template in document_templates:
+        pieces = parse_template(template)
         for _ in range(50):  # Generate 50 examples per template
             # Fill in random values
             field_values = {}
             for field, values in realistic_values.items():
                 if f"{{{field}}}" in template:
-                    field_values[field] = random.choice(values)
+                    field_values[field] = rng.choice(values)
             
             try:
-                # Create text and find entities
-                text = template.format(**field_values)
-                tokens = text.split()
-                labels = ["O"] * len(tokens)
+                # Create text and label entities from the substituted spans
+                text, spans = render_template(pieces, field_values)
+                tokens, labels = create_bio_labels(text, spans)
                 
-                # Label entities
-                for field, value in field_values.items():
-                    tmp_labels = create_bio_labels(tokens, value, field)
-                    # Merge labels, preferring B/I over O
-                    for i, label in enumerate(tmp_labels):
-                        if label != "O":
-                            labels[i] = label
-                
-                examples.append({
+                yield {
                     "tokens": tokens,
                     "labels": labels,
                     "text": text
-                })
+                }
                 
             except Exception as e:
                 print(f"Error generating example: {e}")
@@ -261,39 +281,224 @@ def create_training_examples(min_examples: int = 10) -> List[Dict[str, Any]]:
     # Add variations with different date formats
     date_fields = ['admission_date', 'discharge_date']
     for field in date_fields:
+        pieces = parse_template(f"תאריך {field.replace('_date', '')}: {{{field}}}")
         for _ in range(30):
-            date = datetime.datetime.now() + datetime.timedelta(days=random.randint(-30, 30))
+            date = REFERENCE_DATE + datetime.timedelta(days=rng.randint(-30, 30))
             date_formats = ['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d']
             for date_format in date_formats:
                 date_str = date.strftime(date_format)
-                text = f"תאריך {field.replace('_date', '')}: {date_str}"
-                tokens = text.split()
-                labels = create_bio_labels(tokens, date_str, field)
-                examples.append({
+                text, spans = render_template(pieces, {field: date_str})
+                tokens, labels = create_bio_labels(text, spans)
+                yield {
                     "tokens": tokens,
                     "labels": labels,
                     "text": text
-                })
-    
-    # Ensure minimum number of examples
-    while len(examples) < min_examples:
-        examples.extend(random.sample(examples, min(len(examples), min_examples - len(examples))))
+                }
+
+def example_digest(example: Dict[str, Any]) -> bytes:
+    """Compact content hash of an example's text and labels."""
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(example["text"].encode('utf-8'))
+    hasher.update(" ".join(example["labels"]).encode('utf-8'))
+    return hasher.digest()
+
+def iter_unique_examples(rng: random.Random, patience: int = 1000,
+                         exclude: FrozenSet[bytes] = frozenset(),
+                         window: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Yield only examples not seen before and whose digest is not in exclude.
+
+    Sampling stops once patience consecutive draws are all duplicates,
+    i.e. when the template/value combinations are effectively exhausted.
+    With window set, only the last window digests are remembered, so memory
+    stays bounded on endless streams at the cost of allowing repeats that
+    are further apart.
+    """
+    seen = set()
+    recent = deque()
+    misses = 0
+    while True:
+        for example in generate_example_round(rng):
+            digest = example_digest(example)
+            if digest in seen or digest in exclude:
+                misses += 1
+                if misses >= patience:
+                    return
+                continue
+            seen.add(digest)
+            if window is not None:
+                recent.append(digest)
+                if len(recent) > window:
+                    seen.discard(recent.popleft())
+            misses = 0
+            yield example
+
+def iter_training_examples(num_examples: Optional[int], seed: int = None,
+                           patience: int = 1000,
+                           exclude: FrozenSet[bytes] = frozenset(),
+                           window: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Stream unique freshly sampled examples (forever if num_examples is None).
+
+    Every consumer (in-memory sets, shards, streaming, replay) goes through
+    here, so examples are always deduplicated by content hash; the stream
+    ends early once the combinations are exhausted (see iter_unique_examples).
+    Examples whose digest is in exclude (e.g. a held-out set) are skipped.
+    """
+    if num_examples is not None and num_examples <= 0:
+        return
+    examples = iter_unique_examples(random.Random(seed), patience, exclude, window)
+    for produced, example in enumerate(examples, 1):
+        yield example
+        if num_examples is not None and produced >= num_examples:
+            return
+
+def count_fields(labels: List[str], field_counts: Dict[str, int]):
+    """Add the entity tokens in labels to field_counts."""
+    for label in labels:
+        if label != "O":
+            field_counts[label[2:]] += 1
+
+def print_field_distribution(field_counts: Dict[str, int]):
+    """Print entity token counts per field, most frequent first."""
+    print("\nField distribution in examples:")
+    for field, count in sorted(field_counts.items(), key=lambda x: x[1], reverse=True):
+        print(f"{field}: {count}")
+
+def create_training_examples(min_examples: int = 10, seed: int = None,
+                             patience: int = 1000) -> List[Dict[str, Any]]:
+    """Generate up to min_examples unique training examples.
+
+    Examples are deduplicated by content hash; if the combinations run out
+    before min_examples, fewer examples are returned rather than copies.
+    """
+    examples = list(iter_training_examples(min_examples, seed, patience))
     
-    print(f"Generated {len(examples)} training examples")
+    if len(examples) < min_examples:
+        print(f"Unique combinations exhausted: {len(examples)} of {min_examples} requested examples")
+    print(f"Generated {len(examples)} unique training examples")
     
     # Print statistics
     field_counts = defaultdict(int)
     for example in examples:
-        for label in example["labels"]:
-            if label != "O":
-                field = label.split("-")[1]
-                field_counts[field] += 1
+        count_fields(example["labels"], field_counts)
+    print_field_distribution(field_counts)
     
-    print("\nField distribution in examples:")
-    for field, count in sorted(field_counts.items(), key=lambda x: x[1], reverse=True):
-        print(f"{field}: {count}")
+    return examples
+
+def shard_seed(seed: int, shard: int) -> int:
+    """Derive an independent, reproducible seed for one shard."""
+    digest = hashlib.sha256(f"{seed}:{shard}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def generate_shard(task: Tuple[int, int, int, str]) -> Dict[str, Any]:
+    """Stream one shard of examples to JSONL and write its field statistics."""
+    shard, num_examples, seed, output_dir = task
+    path = os.path.join(output_dir, f"shard-{shard:05d}.jsonl")
+    field_counts = defaultdict(int)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for example in iter_training_examples(num_examples, shard_seed(seed, shard)):
+            f.write(json.dumps(example, ensure_ascii=False) + "\n")
+            count_fields(example["labels"], field_counts)
+            count += 1
+    
+    stats = {'shard': shard, 'path': path, 'examples': count, 'field_counts': dict(field_counts)}
+    with open(os.path.join(output_dir, f"shard-{shard:05d}.stats.json"), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False)
+    return stats
+
+def dedupe_shards(output_dir: str, num_shards: int) -> int:
+    """Drop examples that repeat one in an earlier shard; return how many.
+
+    Shards are only unique within themselves, since each samples the same
+    combination space from its own seed. Shards are rewritten in order
+    (with their statistics) keeping the first occurrence of every digest.
+    """
+    seen = set()
+    dropped = 0
+    for shard in range(num_shards):
+        path = os.path.join(output_dir, f"shard-{shard:05d}.jsonl")
+        field_counts = defaultdict(int)
+        count = 0
+        with open(path, encoding='utf-8') as src, open(path + ".tmp", 'w', encoding='utf-8') as dst:
+            for line in src:
+                example = json.loads(line)
+                digest = example_digest(example)
+                if digest in seen:
+                    dropped += 1
+                    continue
+                seen.add(digest)
+                dst.write(line)
+                count_fields(example["labels"], field_counts)
+                count += 1
+        os.replace(path + ".tmp", path)
+        
+        stats = {'shard': shard, 'path': path, 'examples': count, 'field_counts': dict(field_counts)}
+        with open(os.path.join(output_dir, f"shard-{shard:05d}.stats.json"), 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False)
+    return dropped
+
+def merge_shard_stats(output_dir: str) -> Dict[str, Any]:
+    """Combine per-shard statistics in output_dir into stats.json."""
+    merged = {'shards': 0, 'examples': 0, 'field_counts': defaultdict(int)}
+    for name in sorted(os.listdir(output_dir)):
+        if not (name.startswith("shard-") and name.endswith(".stats.json")):
+            continue
+        with open(os.path.join(output_dir, name), encoding='utf-8') as f:
+            stats = json.load(f)
+        merged['shards'] += 1
+        merged['examples'] += stats['examples']
+        for field, count in stats['field_counts'].items():
+            merged['field_counts'][field] += count
+    
+    merged['field_counts'] = dict(merged['field_counts'])
+    with open(os.path.join(output_dir, "stats.json"), 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    return merged
+
+def generate_sharded(
+    num_examples: int,
+    num_shards: int,
+    output_dir: str,
+    seed: int = 0,
+    workers: int = None
+) -> Dict[str, Any]:
+    """Generate num_examples across num_shards JSONL files using a process pool.
+
+    Every shard draws from its own seed derived from (seed, shard), so the
+    output does not depend on the number of workers or scheduling order.
+    Examples repeated across shards are then dropped (see dedupe_shards),
+    so the merged set may hold fewer than num_examples.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    base, extra = divmod(num_examples, num_shards)
+    tasks = [
+        (shard, base + (1 if shard < extra else 0), seed, output_dir)
+        for shard in range(num_shards)
+    ]
+    
+    with multiprocessing.Pool(workers) as pool:
+        for stats in pool.imap_unordered(generate_shard, tasks):
+            print(f"Shard {stats['shard']}: wrote {stats['examples']} examples to {stats['path']}")
     
-    return examples[:min_examples]
+    dropped = dedupe_shards(output_dir, num_shards)
+    if dropped:
+        print(f"Dropped {dropped} examples repeated across shards")
+    merged = merge_shard_stats(output_dir)
+    print(f"\nGenerated {merged['examples']} training examples in {merged['shards']} shards")
+    print_field_distribution(merged['field_counts'])
+    return merged
+
+def read_examples(path: str) -> List[Dict[str, Any]]:
+    """Read labelled examples from a JSONL file (e.g. a generated shard)."""
+    examples = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                if len(example["tokens"]) != len(example["labels"]):
+                    raise ValueError(f"Token/label count mismatch in {path}: {line[:80]}")
+                examples.append(example)
+    return examples
 
 def save_examples(examples: List[Dict[str, Any]], output_dir: str = "data"):
     """Save generated examples for inspection."""
@@ -320,14 +525,25 @@ if __name__ == "__main__":
     parser.add_argument('--min_examples', type=int, default=5000,
                     help='Minimum number of examples to generate')
     parser.add_argument('--output_dir', default='data',
-                    help='Directory to save example inspections')
+                    help='Directory to save example inspections (or shards)')
+    parser.add_argument('--shards', type=int, default=0,
+                    help='Stream --min_examples examples into this many JSONL shards')
+    parser.add_argument('--workers', type=int, default=None,
+                    help='Worker processes for sharded generation (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0,
+                    help='Base seed; each shard derives its own seed from it')
     
     args = parser.parse_args()
     
+    if args.shards > 0:
+        generate_sharded(args.min_examples, args.shards, args.output_dir,
+                         seed=args.seed, workers=args.workers)
+        raise SystemExit(0)
+    
     try:
         # Generate examples
         print("Generating training examples...")
-        examples = create_training_examples(min_examples=args.min_examples)
+        examples = create_training_examples(min_examples=args.min_examples, seed=args.seed)
         
         # Save example inspections
         print("\nSaving example inspections...")
@@ -1,9 +1,19 @@
 from dataclasses import dataclass
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import argparse
 import json
 import logging
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Tuple, Iterator
 import re
+import sys
+
+# The entity table and section segmenter are shared with the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from entity_table import EntityTable, DocumentResult
+from nemo_parser import SectionSegmenter
 
 @dataclass
 class FieldOption:
@@ -12,9 +22,17 @@ class FieldOption:
     options: List[str]
 
 class DocumentProcessor:
-    def __init__(self, model_path: str, confidence_threshold: float = 0.7):
+    def __init__(
+        self,
+        model_path: str,
+        confidence_threshold: float = 0.7,
+        section_headers: Dict[str, str] = None,
+        table: EntityTable = None
+    ):
         self.model_path = model_path
         self.confidence_threshold = confidence_threshold
+        self.segmenter = SectionSegmenter(section_headers)
+        self.table = table if table is not None else EntityTable()
         self._setup_patterns()
 
     def _setup_patterns(self):
@@ -30,51 +48,40 @@ class DocumentProcessor:
             'mmse_score': r'MMSE:?\s*(\d+)(?:/30)?'
         }
 
-    def process_document(self, text: str) -> Dict[str, Any]:
-        """Process a document and extract information."""
+    def process_document(self, text: str, doc_id: int = None) -> DocumentResult:
+        """Process a document and extract information.
+
+        doc_id refers to a document already in self.table; when omitted the
+        text is registered as a new document.
+        """
         try:
-            return {
-                'entities': self._extract_entities(text),
-                'sections': self._extract_sections(text),
-                'original_text': text
-            }
+            if doc_id is None:
+                doc_id = self.table.add_document(text)
+            first = len(self.table)
+            self._extract_entities(text, doc_id)
+            return DocumentResult(
+                self.table, doc_id, first, len(self.table), self._extract_sections(text)
+            )
         except Exception as e:
             logging.error(f"Error processing document: {str(e)}")
             raise
 
-    def _extract_entities(self, text: str) -> List[Dict[str, Any]]:
-        """Extract entities from text using patterns."""
-        entities = []
+    def _extract_entities(self, text: str, doc_id: int):
+        """Extract entities from text using patterns into self.table."""
         for field, pattern in self.PATTERNS.items():
             matches = re.finditer(pattern, text)
             for match in matches:
-                entity_text = match.group(1) if len(match.groups()) > 0 else match.group(0)
-                entities.append({
-                    'text': entity_text,
-                    'label': field,
-                    'confidence': 1.0,  # Pattern matches get high confidence
-                    'start': match.start(),
-                    'end': match.end()
-                })
-        return entities
-
-    def _extract_sections(self, text: str) -> Dict[str, str]:
-        """Extract document sections."""
-        sections = {}
-        section_patterns = {
-            'personal_info': r'פרטים\s*אישיים:(.*?)(?:מקור|$)',
-            'admission_info': r'מקור\s*הפניה:(.*?)(?:מצב|$)',
-            'physical_exam': r'בדיקה\s*גופנית:(.*?)(?:אבחנות|$)',
-            'diagnoses': r'אבחנות:(.*?)(?:המלצות|$)',
-            'recommendations': r'המלצות:(.*?)(?:$)'
-        }
-
-        for section, pattern in section_patterns.items():
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                sections[section] = match.group(1).strip()
+                group = 1 if len(match.groups()) > 0 else 0
+                self.table.add(
+                    doc_id, field, match.start(), match.end(),
+                    match.start(group), match.end(group),
+                    confidence=1.0,  # Pattern matches get high confidence
+                    document=text
+                )
 
-        return sections
+    def _extract_sections(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """Extract document sections as (start, end) offsets into text."""
+        return self.segmenter.first_spans(text)
 
 def setup_logging():
     logging.basicConfig(
@@ -87,50 +94,79 @@ def read_file(file_path: str) -> List[str]:
     with open(file_path, 'r', encoding='utf-8') as f:
         return [line.strip() for line in f if line.strip()]
 
-def save_results(results: List[Dict], output_file: str):
+def save_results(results: List[DocumentResult], output_file: str):
     """Save results to JSON file."""
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+        json.dump([result.to_dict() for result in results], f, ensure_ascii=False, indent=2)
 
-def print_entity_stats(results: List[Dict[str, Any]]):
-    """Print statistics about extracted entities."""
-    entity_counts = {}
-    confidence_sums = {}
-    
+def iter_file(file_path: str) -> Iterator[str]:
+    """Yield the non-empty lines of a file one at a time."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+class ValidationStats:
+    """Running entity and section counts, updated one document at a time.
+
+    Partial stats from worker processes are combined with merge().
+    """
+
+    def __init__(self):
+        self.documents = 0
+        self.failures = 0
+        self.entity_counts = Counter()
+        self.confidence_sums = Counter()
+        self.section_counts = Counter()
+
+    def add(self, result: DocumentResult):
+        self.documents += 1
+        for entity in result.entities:
+            self.entity_counts[entity.label] += 1
+            self.confidence_sums[entity.label] += entity.confidence
+        self.section_counts.update(result.sections.keys())
+
+    def merge(self, other: 'ValidationStats'):
+        self.documents += other.documents
+        self.failures += other.failures
+        self.entity_counts.update(other.entity_counts)
+        self.confidence_sums.update(other.confidence_sums)
+        self.section_counts.update(other.section_counts)
+
+    def print_entity_stats(self):
+        print("\nEntity Statistics:")
+        print("=" * 60)
+        print(f"{'Entity Type':<25} {'Count':<8} {'Avg Confidence':<15}")
+        print("-" * 60)
+        
+        for label in sorted(self.entity_counts.keys()):
+            count = self.entity_counts[label]
+            avg_conf = self.confidence_sums[label] / count
+            print(f"{label:<25} {count:<8} {avg_conf:.4f}")
+
+    def print_section_stats(self):
+        print("\nSection Statistics:")
+        print("=" * 40)
+        print(f"{'Section Type':<25} {'Count':<8}")
+        print("-" * 40)
+        
+        for section in sorted(self.section_counts.keys()):
+            print(f"{section:<25} {self.section_counts[section]:<8}")
+
+def _stats_of(results: List[DocumentResult]) -> ValidationStats:
+    stats = ValidationStats()
     for doc in results:
-        for entity in doc['entities']:
-            label = entity['label']
-            if label not in entity_counts:
-                entity_counts[label] = 0
-                confidence_sums[label] = 0
-            entity_counts[label] += 1
-            confidence_sums[label] += entity['confidence']
-    
-    print("\nEntity Statistics:")
-    print("=" * 60)
-    print(f"{'Entity Type':<25} {'Count':<8} {'Avg Confidence':<15}")
-    print("-" * 60)
-    
-    for label in sorted(entity_counts.keys()):
-        count = entity_counts[label]
-        avg_conf = confidence_sums[label] / count
-        print(f"{label:<25} {count:<8} {avg_conf:.4f}")
-
-def print_section_stats(results: List[Dict[str, Any]]):
+        stats.add(doc)
+    return stats
+
+def print_entity_stats(results: List[DocumentResult]):
+    """Print statistics about extracted entities."""
+    _stats_of(results).print_entity_stats()
+
+def print_section_stats(results: List[DocumentResult]):
     """Print statistics about extracted sections."""
-    section_counts = {}
-    
-    for doc in results:
-        for section in doc['sections'].keys():
-            section_counts[section] = section_counts.get(section, 0) + 1
-    
-    print("\nSection Statistics:")
-    print("=" * 40)
-    print(f"{'Section Type':<25} {'Count':<8}")
-    print("-" * 40)
-    
-    for section in sorted(section_counts.keys()):
-        print(f"{section:<25} {section_counts[section]:<8}")
+    _stats_of(results).print_section_stats()
 
 def validate_documents(
     model_path: str,
@@ -140,9 +176,11 @@ def validate_documents(
 ):
     """Run validation on documents."""
     # Initialize processor
+    table = EntityTable()
     processor = DocumentProcessor(
         model_path=model_path,
-        confidence_threshold=confidence_threshold
+        confidence_threshold=confidence_threshold,
+        table=table
     )
     
     # Read input texts
@@ -159,15 +197,18 @@ def validate_documents(
             print(f"\nDocument {i}:")
             print("=" * 80)
             print("\nExtracted Entities:")
-            for entity in result['entities']:
-                print(f"  • {entity['label']}: '{entity['text']}' "
-                      f"(confidence: {entity['confidence']:.4f})")
+            for entity in result.entities:
+                print(f"  • {entity.label}: '{entity.text}' "
+                      f"(confidence: {entity.confidence:.4f})")
             
-            if result['sections']:
+            if result.sections:
                 print("\nExtracted Sections:")
-                for section, content in result['sections'].items():
+                for section, (start, end) in result.sections.items():
                     print(f"\n{section}:")
-                    print(content[:200] + "..." if len(content) > 200 else content)
+                    if end - start > 200:
+                        print(text[start:start + 200] + "...")
+                    else:
+                        print(text[start:end])
             
             results.append(result)
             
@@ -181,6 +222,87 @@ def validate_documents(
     save_results(results, output_file)
     logging.info(f"Results saved to {output_file}")
 
+_worker_processor: DocumentProcessor = None
+
+def _init_worker(model_path: str, confidence_threshold: float):
+    global _worker_processor
+    _worker_processor = DocumentProcessor(
+        model_path=model_path,
+        confidence_threshold=confidence_threshold
+    )
+
+def _validate_chunk(first_index: int, texts: List[str]) -> Tuple[List[str], ValidationStats]:
+    """Process one chunk of documents in a worker.
+
+    Returns compact JSON lines (without the document text) and the chunk's
+    partial statistics. Each chunk gets a fresh EntityTable that keeps only
+    entity slices, so workers do not hold on to document texts.
+    """
+    _worker_processor.table = EntityTable(keep_documents=False)
+    stats = ValidationStats()
+    lines = []
+    for offset, text in enumerate(texts):
+        try:
+            result = _worker_processor.process_document(text)
+        except Exception as e:
+            logging.error(f"Error processing document {first_index + offset + 1}: {str(e)}")
+            stats.failures += 1
+            continue
+        record = result.to_dict()
+        record['doc_id'] = first_index + offset
+        lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        stats.add(result)
+    return lines, stats
+
+def validate_corpus(
+    model_path: str,
+    input_file: str,
+    output_file: str = "validation_results.jsonl",
+    confidence_threshold: float = 0.7,
+    workers: int = None,
+    chunk_size: int = 256
+) -> ValidationStats:
+    """Validate a large corpus across a process pool, streaming JSONL results.
+
+    Documents are read lazily and sent to workers in chunks of chunk_size;
+    at most two chunks per worker are in flight, so memory stays bounded
+    whatever the corpus size. Results are written in input order, one
+    compact JSON object per line, and statistics are aggregated as chunks
+    complete.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = ValidationStats()
+    texts = iter_file(input_file)
+    pending = deque()
+    first_index = 0
+    
+    logging.info(f"Validating {input_file} with {workers} workers")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model_path, confidence_threshold)
+    ) as pool, open(output_file, 'w', encoding='utf-8') as out:
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(texts, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_validate_chunk, first_index, chunk))
+                first_index += len(chunk)
+            if not pending:
+                break
+            
+            lines, chunk_stats = pending.popleft().result()
+            for line in lines:
+                out.write(line + '\n')
+            stats.merge(chunk_stats)
+            logging.info(f"Processed {stats.documents + stats.failures}/{first_index} texts read so far")
+    
+    stats.print_entity_stats()
+    stats.print_section_stats()
+    logging.info(f"{stats.documents} results saved to {output_file} ({stats.failures} failed)")
+    return stats
+
 def main():
     parser = argparse.ArgumentParser(description='Validate Hebrew Medical NER')
     
@@ -198,8 +320,9 @@ def main():
     
     parser.add_argument(
         '--output_file',
-        default='validation_results.json',
-        help='Output JSON file for results'
+        default=None,
+        help='Output JSON file for results (default: validation_results.json, '
+             'or validation_results.jsonl with --parallel)'
     )
     
     parser.add_argument(
@@ -209,15 +332,46 @@ def main():
         help='Confidence threshold for entity extraction'
     )
     
+    parser.add_argument(
+        '--parallel',
+        action='store_true',
+        help='Validate across a process pool and stream compact JSONL results'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Worker processes for --parallel (default: all cores)'
+    )
+    
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=256,
+        help='Documents per worker task for --parallel'
+    )
+    
     args = parser.parse_args()
     
     setup_logging()
     
     try:
+        if args.parallel:
+            validate_corpus(
+                model_path=args.model_path,
+                input_file=args.input_file,
+                output_file=args.output_file or 'validation_results.jsonl',
+                confidence_threshold=args.confidence,
+                workers=args.workers,
+                chunk_size=args.chunk_size
+            )
+            return
+        
         validate_documents(
             model_path=args.model_path,
             input_file=args.input_file,
-            output_file=args.output_file,
+            output_file=args.output_file or 'validation_results.json',
             confidence_threshold=args.confidence
         )
     except Exception as e:
@@ -0,0 +1,236 @@
+import os
+import csv
+import json
+import glob
+import time
+import shutil
+import random
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Any
+import numpy as np
+from transformers import AutoTokenizer, TrainerCallback
+from data_generator import load_parameters
+from trainer import train, prepare_datasets, get_labels, BASE_MODEL
+
+# Values sampled for each trial
+SEARCH_SPACE = {
+    'learning_rate': [1e-5, 2e-5, 3e-5, 5e-5, 8e-5, 1e-4],
+    'num_train_epochs': [2, 3, 5],
+    'batch_size': [8, 16, 32],
+    'warmup_ratio': [0.0, 0.05, 0.1, 0.2]
+}
+
+class MedianPruningCallback(TrainerCallback):
+    """Stop a trial whose F1 falls below the median of other trials at the same point.
+
+    Trials publish every intermediate F1 as a small JSON file in
+    reports_dir, so concurrently running processes can compare progress
+    without any other coordination. Reports are keyed by training examples
+    seen rather than by step, since batch sizes differ between trials, and
+    rounded to the nearest multiple of eval_every so trials whose batch
+    size does not divide it still meet. Pruning starts once min_peers
+    other trials have reported for a point. Evaluations at or after the
+    end of training (e.g. of the best checkpoint) are ignored.
+    """
+
+    def __init__(self, reports_dir: str, trial: int, eval_every: int, min_peers: int = 2,
+                 metric: str = "eval_f1"):
+        self.reports_dir = reports_dir
+        self.trial = trial
+        self.eval_every = eval_every
+        self.min_peers = min_peers
+        self.metric = metric
+        self.pruned = False
+        self.finished = False
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.finished = True
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if not metrics or self.metric not in metrics:
+            return
+        if self.finished or (state.max_steps and state.global_step >= state.max_steps):
+            return
+        value = metrics[self.metric]
+        seen = (state.global_step * args.per_device_train_batch_size
+                * args.gradient_accumulation_steps * args.world_size)
+        examples = max(1, round(seen / self.eval_every)) * self.eval_every
+        with open(os.path.join(self.reports_dir, f"trial-{self.trial}-examples-{examples}.json"), 'w') as f:
+            json.dump({'trial': self.trial, 'examples': examples, 'value': value}, f)
+
+        peers = []
+        for path in glob.glob(os.path.join(self.reports_dir, f"trial-*-examples-{examples}.json")):
+            with open(path) as f:
+                report = json.load(f)
+            if report['trial'] != self.trial:
+                peers.append(report['value'])
+
+        if len(peers) >= self.min_peers and value < float(np.median(peers)):
+            logging.info(f"Pruning trial {self.trial} after {examples} examples: "
+                         f"{self.metric}={value:.4f} < median {np.median(peers):.4f}")
+            self.pruned = True
+            control.should_training_stop = True
+
+def sample_trials(num_trials: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Draw distinct hyperparameter combinations from SEARCH_SPACE."""
+    rng = random.Random(seed)
+    total = int(np.prod([len(values) for values in SEARCH_SPACE.values()]))
+    trials = []
+    seen = set()
+    while len(trials) < min(num_trials, total):
+        params = {name: rng.choice(values) for name, values in SEARCH_SPACE.items()}
+        key = tuple(params.values())
+        if key not in seen:
+            seen.add(key)
+            trials.append(params)
+    return trials
+
+def run_trial(trial: int, params: Dict[str, Any], sweep_dir: str, threads: int,
+              eval_every: int, common: Dict[str, Any]) -> Dict[str, Any]:
+    """Train one configuration in this (worker) process.
+
+    The trial evaluates (and saves) every eval_every training examples,
+    so all trials report at the same points whatever their batch size.
+    """
+    pruning = MedianPruningCallback(os.path.join(sweep_dir, "reports"), trial, eval_every)
+    eval_steps = max(1, eval_every // params['batch_size'])
+    start = time.time()
+    results = train(
+        output_dir=os.path.join(sweep_dir, f"trial-{trial}"),
+        threads_per_rank=threads,
+        callbacks=[pruning],
+        eval_steps=eval_steps,
+        save_steps=eval_steps,
+        **params,
+        **common
+    )
+    return {
+        'trial': trial,
+        **params,
+        'f1': results.get('eval_f1'),
+        'precision': results.get('eval_precision'),
+        'recall': results.get('eval_recall'),
+        'pruned': pruning.pruned,
+        'minutes': round((time.time() - start) / 60, 2)
+    }
+
+def write_leaderboard(results: List[Dict[str, Any]], sweep_dir: str) -> List[Dict[str, Any]]:
+    """Sort trials by F1 and write leaderboard.csv/.json to sweep_dir."""
+    leaderboard = sorted(results, key=lambda result: result['f1'] or 0, reverse=True)
+    with open(os.path.join(sweep_dir, "leaderboard.json"), 'w', encoding='utf-8') as f:
+        json.dump(leaderboard, f, indent=2)
+    with open(os.path.join(sweep_dir, "leaderboard.csv"), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(leaderboard[0].keys()))
+        writer.writeheader()
+        writer.writerows(leaderboard)
+
+    print("\nLeaderboard:")
+    print("=" * 100)
+    print(f"{'Trial':<7} {'F1':<8} {'LR':<9} {'Epochs':<8} {'Batch':<7} {'Warmup':<8} {'Pruned':<8} {'Minutes':<8}")
+    print("-" * 100)
+    for result in leaderboard:
+        print(f"{result['trial']:<7} {result['f1'] or 0:<8.4f} {result['learning_rate']:<9g} "
+              f"{result['num_train_epochs']:<8} {result['batch_size']:<7} {result['warmup_ratio']:<8} "
+              f"{str(result['pruned']):<8} {result['minutes']:<8}")
+    return leaderboard
+
+def sweep(
+    sweep_dir: str = "../sweeps/hebrew-medical-ner",
+    num_trials: int = 12,
+    parallel: int = 4,
+    total_threads: int = None,
+    eval_every: int = 3200,
+    min_examples: int = 5000,
+    seed: int = 42,
+    cache_dir: str = "../cache"
+) -> List[Dict[str, Any]]:
+    """Run num_trials configurations, parallel at a time, and write a leaderboard.
+
+    Each trial is a separate process limited to total_threads // parallel
+    intra-op threads and evaluated every eval_every training examples. The
+    encoded dataset is built once up front in cache_dir and memory-mapped
+    by every trial. Pruning reports of earlier sweeps in sweep_dir are
+    cleared first.
+    """
+    reports_dir = os.path.join(sweep_dir, "reports")
+    shutil.rmtree(reports_dir, ignore_errors=True)
+    os.makedirs(reports_dir)
+    threads = max(1, (total_threads or os.cpu_count() or 1) // parallel)
+    common = {
+        'min_examples': min_examples,
+        'max_examples': min_examples,
+        'seed': seed,
+        'cache_dir': cache_dir
+    }
+
+    # Build the shared cache before any trial starts
+    label2id = {v: k for k, v in get_labels(load_parameters()).items()}
+    prepare_datasets(
+        AutoTokenizer.from_pretrained(BASE_MODEL),
+        label2id,
+        seed=seed,
+        min_examples=min_examples,
+        max_examples=min_examples,
+        cache_dir=cache_dir
+    )
+
+    trials = sample_trials(num_trials, seed)
+    logging.info(f"Running {len(trials)} trials, {parallel} at a time with {threads} threads each")
+    results = []
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(run_trial, trial, params, sweep_dir, threads, eval_every, common): trial
+            for trial, params in enumerate(trials)
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Trial {futures[future]} failed: {e}")
+                continue
+            logging.info(f"Trial {result['trial']} finished: f1={result['f1']}, pruned={result['pruned']}")
+            results.append(result)
+
+    if not results:
+        raise RuntimeError("All sweep trials failed")
+    return write_leaderboard(results, sweep_dir)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for the Hebrew Medical NER trainer')
+    parser.add_argument('--sweep_dir', default='../sweeps/hebrew-medical-ner',
+                       help='Directory for trial outputs and the leaderboard')
+    parser.add_argument('--trials', type=int, default=12,
+                       help='Number of configurations to try')
+    parser.add_argument('--parallel', type=int, default=4,
+                       help='Trials running concurrently')
+    parser.add_argument('--threads', type=int, default=None,
+                       help='Total CPU threads split across concurrent trials (default: all cores)')
+    parser.add_argument('--eval_every', type=int, default=3200,
+                       help='Evaluation (and pruning) interval in training examples')
+    parser.add_argument('--min_examples', type=int, default=5000,
+                       help='Training examples per trial')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Seed for data generation and trial sampling')
+    parser.add_argument('--cache_dir', default='../cache',
+                       help='Shared dataset cache directory')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    sweep(
+        sweep_dir=args.sweep_dir,
+        num_trials=args.trials,
+        parallel=args.parallel,
+        total_threads=args.threads,
+        eval_every=args.eval_every,
+        min_examples=args.min_examples,
+        seed=args.seed,
+        cache_dir=args.cache_dir
+    )
+
+if __name__ == "__main__":
+    main()
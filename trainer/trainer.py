@@ -1,20 +1,44 @@
 import os
+import re
+import copy
 import json
+import math
+import time
+import shutil
+import hashlib
+import functools
+import contextlib
 import torch
 import logging
+import multiprocessing
+import transformers
 from transformers import (
     AutoTokenizer, 
     AutoModelForTokenClassification, 
     Trainer, 
+    TrainerCallback,
+    EarlyStoppingCallback,
     TrainingArguments,
     DataCollatorForTokenClassification
 )
-from datasets import Dataset
+from datasets import Dataset, DatasetDict, IterableDataset, load_from_disk
 import numpy as np
-from typing import Dict, List, Any
-import seqeval.metrics as seqeval
-from data_generator import create_training_examples, load_parameters
-from collections import defaultdict
+import data_generator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Union, Iterator, Tuple, FrozenSet
+from data_generator import (
+    create_training_examples,
+    iter_training_examples,
+    example_digest,
+    read_examples,
+    shard_seed,
+    create_realistic_values,
+    create_medical_document_templates,
+    load_parameters,
+    PARAMETERS_FILE
+)
+
+BASE_MODEL = "onlplab/alephbert-base"
 
 def setup_logging(output_dir: str = "../hebrew-medical-ner"):
     """Setup logging configuration."""
@@ -38,122 +62,604 @@ def get_labels(params_df):
         label_id += 2
     return id2label
 
-def encode_dataset(examples: List[Dict[str, Any]], tokenizer, label2id: Dict[str, int]) -> Dataset:
-    """Encode dataset with improved subword token handling."""
-    features = {
-        'input_ids': [],
-        'attention_mask': [],
-        'labels': []
-    }
-    
-    max_length = 256
-    
-    for example in examples:
-        # Tokenize without creating tensors yet
+def align_labels(word_ids: List[Any], word_label_ids: List[int], continuation_ids: List[int]) -> List[int]:
+    """Map word-level label ids onto subword tokens (special tokens get -100)."""
+    label_ids = []
+    previous_word_id = None
+    for word_id in word_ids:
+        if word_id is None or word_id >= len(word_label_ids):
+            label_ids.append(-100)
+        elif word_id != previous_word_id:
+            # First token of a word
+            label_ids.append(word_label_ids[word_id])
+        else:
+            # Continuation subword token uses the I- label of its word
+            label_ids.append(continuation_ids[word_id])
+        previous_word_id = word_id
+    return label_ids
+
+def make_batch_encoder(tokenizer, label2id: Dict[str, int], max_length: int = 256, with_length: bool = True):
+    """Build a batched map function turning tokens/labels into model features."""
+    def continuation(label: str) -> str:
+        return "I-" + label[2:] if label.startswith("B-") else label
+
+    def encode_batch(batch: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
         encoding = tokenizer(
-            example["text"],
+            batch['tokens'],
+            is_split_into_words=True,
             truncation=True,
-            padding='max_length',
-            max_length=max_length,
-            return_tensors=None
+            max_length=max_length
         )
-        
-        # Initialize label ids
-        label_ids = [-100] * max_length
-        word_ids = tokenizer(example["text"], return_tensors=None).word_ids()
-        
-        # Previous word id for tracking subwords
-        previous_word_id = None
-        
-        # Align labels with tokenized words
-        for idx, word_id in enumerate(word_ids):
-            if word_id is None:
-                continue
-                
-            if word_id != previous_word_id:
-                # First token of a word
-                if word_id < len(example["labels"]):
-                    label = example["labels"][word_id]
-                    label_ids[idx] = label2id.get(label, 0)
+        labels = []
+        for i, word_labels in enumerate(batch['labels']):
+            word_label_ids = [label2id.get(label, 0) for label in word_labels]
+            continuation_ids = [label2id.get(continuation(label), 0) for label in word_labels]
+            labels.append(align_labels(encoding.word_ids(i), word_label_ids, continuation_ids))
+        encoding['labels'] = labels
+        if with_length:
+            encoding['length'] = [len(input_ids) for input_ids in encoding['input_ids']]
+        return encoding
+
+    return encode_batch
+
+def encode_dataset(
+    examples: Union[List[Dict[str, Any]], Dataset],
+    tokenizer,
+    label2id: Dict[str, int],
+    max_length: int = 256,
+    batch_size: int = 1000
+) -> Dataset:
+    """Encode dataset in batches, tokenizing every example exactly once.
+
+    Sequences are stored unpadded together with their length; padding is
+    left to DataCollatorForTokenClassification and the length column lets
+    the Trainer group batches of similar size.
+    """
+    if isinstance(examples, Dataset):
+        raw = examples.select_columns(['tokens', 'labels'])
+    else:
+        raw = Dataset.from_dict({
+            'tokens': [example['tokens'] for example in examples],
+            'labels': [example['labels'] for example in examples]
+        })
+
+    return raw.map(
+        make_batch_encoder(tokenizer, label2id, max_length),
+        batched=True,
+        batch_size=batch_size,
+        remove_columns=raw.column_names
+    )
+
+def pack_dataset(dataset: Dataset, max_length: int = 256, batch_size: int = 1000) -> Dataset:
+    """Pack encoded examples into rows of up to max_length tokens.
+
+    Examples are placed first-fit-decreasing within each map batch and keep
+    their own [CLS]/[SEP] tokens and labels. Position ids restart at 0 for
+    every packed example, which PackedDataCollator uses to recover segment
+    boundaries for the attention mask.
+    """
+    def pack_batch(batch: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        sizes = [len(input_ids) for input_ids in batch['input_ids']]
+        bins = []  # [used_tokens, example_indices]
+        for i in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+            for packed in bins:
+                if packed[0] + sizes[i] <= max_length:
+                    packed[0] += sizes[i]
+                    packed[1].append(i)
+                    break
             else:
-                # Continuation subword token
-                if word_id < len(example["labels"]):
-                    label = example["labels"][word_id]
-                    if label.startswith("B-"):
-                        label = "I-" + label[2:]  # Convert B- to I- for continuation
-                    label_ids[idx] = label2id.get(label, 0)
-            
-            previous_word_id = word_id
-        
-        features['input_ids'].append(encoding['input_ids'])
-        features['attention_mask'].append(encoding['attention_mask'])
-        features['labels'].append(label_ids)
-    
-    return Dataset.from_dict(features)
+                bins.append([sizes[i], [i]])
+
+        rows = {'input_ids': [], 'labels': [], 'position_ids': [], 'length': []}
+        for used, indices in bins:
+            input_ids, labels, position_ids = [], [], []
+            for i in indices:
+                input_ids.extend(batch['input_ids'][i])
+                labels.extend(batch['labels'][i])
+                position_ids.extend(range(sizes[i]))
+            rows['input_ids'].append(input_ids)
+            rows['labels'].append(labels)
+            rows['position_ids'].append(position_ids)
+            rows['length'].append(used)
+        return rows
+
+    return dataset.map(
+        pack_batch,
+        batched=True,
+        batch_size=batch_size,
+        remove_columns=dataset.column_names
+    )
+
+class PackedDataCollator:
+    """Pad packed rows and mask attention so packed examples stay independent.
+
+    The attention mask is a prepared 4D additive mask ([batch, 1, seq, seq]
+    in the model dtype): 0 within an example's block and the dtype minimum
+    elsewhere, which the model uses as is instead of expanding a 2D
+    padding mask. Unpacked rows (e.g. the evaluation set) use the regular
+    collator.
+    """
+
+    def __init__(self, tokenizer, pad_to_multiple_of: int = 8, dtype: torch.dtype = torch.float32):
+        self.pad_token_id = tokenizer.pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.dtype = dtype
+        self.unpacked_collator = DataCollatorForTokenClassification(
+            tokenizer,
+            pad_to_multiple_of=pad_to_multiple_of
+        )
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        if 'position_ids' not in features[0]:
+            return self.unpacked_collator(features)
+
+        length = max(len(feature['input_ids']) for feature in features)
+        if self.pad_to_multiple_of:
+            length = math.ceil(length / self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        batch_size = len(features)
+        input_ids = torch.full((batch_size, length), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((batch_size, length), -100, dtype=torch.long)
+        position_ids = torch.zeros((batch_size, length), dtype=torch.long)
+        segments = torch.zeros((batch_size, length), dtype=torch.long)
+        for i, feature in enumerate(features):
+            size = len(feature['input_ids'])
+            input_ids[i, :size] = torch.tensor(feature['input_ids'], dtype=torch.long)
+            labels[i, :size] = torch.tensor(feature['labels'], dtype=torch.long)
+            position_ids[i, :size] = torch.tensor(feature['position_ids'], dtype=torch.long)
+            # Segment numbers 1..k; padding stays 0
+            segments[i, :size] = torch.cumsum(position_ids[i, :size] == 0, dim=0)
+
+        allowed = (segments[:, :, None] == segments[:, None, :]) & (segments[:, :, None] > 0)
+        attention_mask = torch.zeros(allowed.shape, dtype=self.dtype)
+        attention_mask.masked_fill_(~allowed, torch.finfo(self.dtype).min)
+        return {
+            'input_ids': input_ids,
+            'labels': labels,
+            'position_ids': position_ids,
+            'attention_mask': attention_mask[:, None, :, :]
+        }
+
+def _hash_inputs(*parts: Any) -> str:
+    """Stable short hash of JSON-serialisable parts."""
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(json.dumps(part, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    return hasher.hexdigest()[:16]
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def generation_cache_key(seed: int, min_examples: int, max_examples: int) -> str:
+    """Cache key for generated examples: generator code, parameters file, templates, values and seed."""
+    return _hash_inputs(
+        _file_digest(data_generator.__file__),
+        _file_digest(PARAMETERS_FILE),
+        create_medical_document_templates(),
+        create_realistic_values(),
+        {'seed': seed, 'min_examples': min_examples, 'max_examples': max_examples}
+    )
+
+def encoding_cache_key(generation_key: str, tokenizer, label2id: Dict[str, int], max_length: int) -> str:
+    """Cache key for encoded examples: generation key plus tokenizer, label ids and max_length."""
+    return _hash_inputs(generation_key, {
+        'tokenizer': tokenizer.name_or_path,
+        'tokenizer_class': type(tokenizer).__name__,
+        'vocab_size': len(tokenizer),
+        'transformers': transformers.__version__,
+        'label2id': label2id,
+        'max_length': max_length
+    })
+
+def _load_or_build(path: str, build):
+    """Load an Arrow dataset from path (memory-mapped) or build and save it."""
+    if os.path.isdir(path):
+        logging.info(f"Loading cached dataset from {path}")
+        return load_from_disk(path)
+    dataset = build()
+    # Write to a temporary directory first so an interrupted run leaves no partial cache
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    dataset.save_to_disk(tmp_path)
+    os.replace(tmp_path, path)
+    return load_from_disk(path)
+
+def prepare_datasets(
+    tokenizer,
+    label2id: Dict[str, int],
+    seed: int = 42,
+    min_examples: int = 1000,
+    max_examples: int = 1000,
+    max_length: int = 256,
+    cache_dir: str = None
+) -> DatasetDict:
+    """Generate, encode and split the training data.
+
+    With cache_dir set, the generated examples and the encoded train/test
+    split are stored as Arrow shards keyed by everything they depend on,
+    and reruns with the same inputs load them memory-mapped.
+    """
+    def generate() -> Dataset:
+        logging.info("Generating training examples...")
+        examples = create_training_examples(min_examples=min_examples, seed=seed)[:max_examples]
+        return Dataset.from_list(examples)
+
+    def encode(generated: Dataset) -> DatasetDict:
+        logging.info("Encoding dataset...")
+        dataset = encode_dataset(generated, tokenizer, label2id, max_length=max_length)
+        return dataset.train_test_split(test_size=0.2, seed=seed)
+
+    if not cache_dir:
+        return encode(generate())
+
+    generation_key = generation_cache_key(seed, min_examples, max_examples)
+    encoding_key = encoding_cache_key(generation_key, tokenizer, label2id, max_length)
+    os.makedirs(cache_dir, exist_ok=True)
+    generated_path = os.path.join(cache_dir, f"generated-{generation_key}")
+    encoded_path = os.path.join(cache_dir, f"encoded-{encoding_key}")
+
+    return _load_or_build(
+        encoded_path, lambda: encode(_load_or_build(generated_path, generate))
+    )
+
+# Digests remembered by the endless training stream's dedupe (about 10 MB)
+STREAM_DEDUPE_WINDOW = 100000
+
+def _stream_examples(seed: int, num_examples: int = None, exclude: FrozenSet[bytes] = frozenset(),
+                     window: int = None) -> Iterator[Dict[str, Any]]:
+    """Generator for IterableDataset.from_generator: tokens/labels rows (endless by default)."""
+    for example in iter_training_examples(num_examples, seed=seed, exclude=exclude, window=window):
+        yield {'tokens': example['tokens'], 'labels': example['labels']}
+
+def prepare_streaming_datasets(
+    tokenizer,
+    label2id: Dict[str, int],
+    seed: int = 42,
+    eval_examples: int = 1000,
+    max_length: int = 256,
+    shuffle_buffer: int = 10000,
+    batch_size: int = 256,
+    dedupe_window: int = STREAM_DEDUPE_WINDOW
+) -> Tuple[IterableDataset, IterableDataset]:
+    """Stream generated examples through tokenization for training and evaluation.
+
+    The training stream is unbounded and shuffled through a buffer of
+    shuffle_buffer encoded rows, and remembers only the last dedupe_window
+    digests, so memory does not grow with the number of examples trained
+    on. The evaluation stream is a fixed sequence of eval_examples generated
+    from a separate derived seed; its digests are computed up front and the
+    training stream never yields them.
+    """
+    encoder = make_batch_encoder(tokenizer, label2id, max_length, with_length=False)
+
+    def stream(gen_kwargs: Dict[str, Any]) -> IterableDataset:
+        # The encoder replaces the raw 'labels' column with aligned label ids,
+        # so only 'tokens' is removed
+        return IterableDataset.from_generator(_stream_examples, gen_kwargs=gen_kwargs).map(
+            encoder,
+            batched=True,
+            batch_size=batch_size,
+            remove_columns=['tokens']
+        )
+
+    eval_seed = shard_seed(seed, -1)
+    held_out = frozenset(
+        example_digest(example) for example in iter_training_examples(eval_examples, seed=eval_seed)
+    )
+    train_stream = stream({
+        'seed': seed, 'exclude': held_out, 'window': dedupe_window
+    }).shuffle(seed=seed, buffer_size=shuffle_buffer)
+    eval_stream = stream({'seed': eval_seed, 'num_examples': eval_examples})
+    return train_stream, eval_stream
+
+def label_tables(id2label: Dict[int, str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Entity types plus per-label-id type index (-1 for O) and B- flag arrays."""
+    entity_types = sorted({label[2:] for label in id2label.values() if label != "O"})
+    type_index = {entity: i for i, entity in enumerate(entity_types)}
+    num_labels = max(id2label) + 1
+    label_type = np.full(num_labels, -1, dtype=np.int64)
+    label_begin = np.zeros(num_labels, dtype=bool)
+    for label_id, label in id2label.items():
+        if label != "O":
+            label_type[label_id] = type_index[label[2:]]
+            label_begin[label_id] = label.startswith("B-")
+    return entity_types, label_type, label_begin
+
+def _chunk_keys(ids: np.ndarray, sentence_start: np.ndarray, label_type: np.ndarray,
+                label_begin: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return a unique key and the type of every BIO chunk in a flat id sequence.
+
+    Follows seqeval's default IOB2 rules: a chunk starts on B-, on I- after
+    O or another type, and at a sentence start; it ends before the next
+    token that does not continue it.
+    """
+    types = label_type[ids]
+    inside = types >= 0
+    previous_types = np.concatenate(([-1], types[:-1]))
+    starts = inside & (label_begin[ids] | sentence_start | (types != previous_types))
+    continues = inside & ~starts
+    ends = inside & ~np.concatenate((continues[1:], [False]))
+
+    start_positions = np.flatnonzero(starts)
+    end_positions = np.flatnonzero(ends)
+    chunk_types = types[start_positions]
+    keys = (start_positions * len(ids) + end_positions) * len(label_type) + chunk_types
+    return keys, chunk_types
+
+def span_metrics(predictions: np.ndarray, labels: np.ndarray, id2label: Dict[int, str]) -> Dict[str, Any]:
+    """Span-level precision/recall/F1 overall and per entity type in one pass.
+
+    predictions and labels are [N, seq] label-id arrays; positions labelled
+    -100 are ignored. Matches seqeval's default (non-strict IOB2) scoring.
+    """
+    entity_types, label_type, label_begin = label_tables(id2label)
+    mask = labels != -100
+    true_ids = labels[mask]
+    pred_ids = predictions[mask]
+    rows = np.nonzero(mask)[0]
+    sentence_start = np.concatenate(([True], rows[1:] != rows[:-1])) if len(rows) else rows.astype(bool)
+
+    true_keys, true_types = _chunk_keys(true_ids, sentence_start, label_type, label_begin)
+    pred_keys, pred_types = _chunk_keys(pred_ids, sentence_start, label_type, label_begin)
+    _, true_hits, _ = np.intersect1d(true_keys, pred_keys, assume_unique=True, return_indices=True)
+
+    num_types = len(entity_types)
+    tp = np.bincount(true_types[true_hits], minlength=num_types)
+    n_true = np.bincount(true_types, minlength=num_types)
+    n_pred = np.bincount(pred_types, minlength=num_types)
+
+    def prf(tp, n_pred, n_true):
+        precision = np.divide(tp, n_pred, out=np.zeros(np.shape(tp)), where=n_pred > 0)
+        recall = np.divide(tp, n_true, out=np.zeros(np.shape(tp)), where=n_true > 0)
+        denominator = precision + recall
+        f1 = np.divide(2 * precision * recall, denominator, out=np.zeros(np.shape(tp)),
+                       where=denominator > 0)
+        return precision, recall, f1
+
+    precision, recall, f1 = prf(tp, n_pred, n_true)
+    total_precision, total_recall, total_f1 = prf(
+        np.array(tp.sum()), np.array(n_pred.sum()), np.array(n_true.sum())
+    )
+    return {
+        "accuracy": float((true_ids == pred_ids).mean()) if len(true_ids) else 0.0,
+        "precision": float(total_precision),
+        "recall": float(total_recall),
+        "f1": float(total_f1),
+        "per_entity": {
+            entity: {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i])
+            }
+            for i, entity in enumerate(entity_types)
+        }
+    }
+
+def argmax_logits(logits: Any, labels: torch.Tensor) -> torch.Tensor:
+    """Reduce each evaluation batch to label ids before the Trainer accumulates it.
+
+    Passed as preprocess_logits_for_metrics, so evaluation keeps an int32
+    [N, seq] array instead of [N, seq, num_labels] float logits.
+    """
+    if isinstance(logits, tuple):
+        logits = logits[0]
+    return logits.argmax(dim=-1).to(torch.int32)
 
 def compute_metrics(id2label, label2id):
    def compute(eval_pred) -> Dict[str, float]:
        """
-       Compute NER evaluation metrics using seqeval.
+       Compute NER evaluation metrics (span-level, seqeval-compatible).
        Args:
            eval_pred: Tuple of predictions and labels from trainer
        Returns:
            Dictionary containing metrics
        """
        predictions, labels = eval_pred
-       predictions = np.argmax(predictions, axis=2)
-
-       # Remove ignored index (special tokens) and convert to string labels
-       true_predictions = []
-       true_labels = []
-       
-       for prediction, label in zip(predictions, labels):
-           pred_list = []
-           label_list = []
-           
-           for p, l in zip(prediction, label):
-               if l != -100:  # Ignore special tokens
-                   pred_list.append(id2label[p])
-                   label_list.append(id2label[l])
-                   
-           true_predictions.append(pred_list)
-           true_labels.append(label_list)
-
-       # Calculate main metrics
-       results = {
-           "accuracy": seqeval.accuracy_score(true_labels, true_predictions),
-           "precision": seqeval.precision_score(true_labels, true_predictions),
-           "recall": seqeval.recall_score(true_labels, true_predictions),
-           "f1": seqeval.f1_score(true_labels, true_predictions)
-       }
-
-       # Calculate per-entity metrics
-       per_entity_metrics = {}
-       
-       # Get unique entity types (removing B- and I- prefixes)
-       entity_types = set()
-       for label in label2id.keys():
-           if label != "O":
-               entity_types.add(label.split("-")[1])
-       
-       # Calculate metrics for each entity type
-       for entity in entity_types:
-           entity_preds = [[label if label.endswith(entity) else "O" for label in seq] 
-                         for seq in true_predictions]
-           entity_labels = [[label if label.endswith(entity) else "O" for label in seq]
-                          for seq in true_labels]
-           
-           per_entity_metrics[entity] = {
-               "precision": seqeval.precision_score(entity_labels, entity_preds),
-               "recall": seqeval.recall_score(entity_labels, entity_preds),
-               "f1": seqeval.f1_score(entity_labels, entity_preds)
-           }
-
-       results["per_entity"] = per_entity_metrics
-       return results
+       if predictions.ndim == 3:
+           # Raw logits (no argmax_logits preprocessing)
+           predictions = np.argmax(predictions, axis=2)
+       return span_metrics(predictions, labels, id2label)
 
    return compute
 
+@functools.lru_cache(maxsize=None)
+def bf16_supported() -> bool:
+    """Whether bf16 autocast runs natively on this machine (AVX512-BF16/AMX on CPU)."""
+    if torch.cuda.is_available():
+        return torch.cuda.is_bf16_supported()
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+@functools.lru_cache(maxsize=None)
+def compile_supported() -> bool:
+    """Whether torch.compile works here; the inductor backend needs a C++ toolchain."""
+    if not hasattr(torch, "compile"):
+        return False
+    try:
+        torch.compile(lambda x: x * 2 + 1)(torch.ones(4))
+        return True
+    except Exception as e:
+        logging.debug(f"torch.compile unavailable: {e}")
+        return False
+
+def resolve_acceleration(bf16: bool = False, compile: bool = False) -> Tuple[bool, bool]:
+    """Drop the requested bf16/compile modes this machine cannot run, with a warning."""
+    if bf16 and not bf16_supported():
+        logging.warning("bf16 is not supported on this machine; falling back to fp32")
+        bf16 = False
+    if compile and not compile_supported():
+        logging.warning("torch.compile is not available; falling back to eager mode")
+        compile = False
+    return bf16, compile
+
+def autocast(bf16: bool = False):
+    """bf16 autocast context on the default device, or a no-op."""
+    if not bf16:
+        return contextlib.nullcontext()
+    return torch.autocast("cuda" if torch.cuda.is_available() else "cpu", dtype=torch.bfloat16)
+
+def prepare_inference_model(model, bf16: bool = False, compile: bool = False):
+    """Put model in eval mode and optionally compile it.
+
+    Returns (model, bf16) where bf16 tells whether forwards should run under
+    autocast(); unsupported modes fall back to fp32 eager.
+    """
+    bf16, compile = resolve_acceleration(bf16, compile)
+    model.eval()
+    if compile:
+        model = torch.compile(model, dynamic=True)
+    return model, bf16
+
+class ThroughputCallback(TrainerCallback):
+    """Log training samples/sec of this rank at every logging step."""
+
+    def __init__(self, samples_per_step: int):
+        self.samples_per_step = samples_per_step
+        self.start_time = None
+        self.start_step = 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.start_time = time.time()
+        self.start_step = state.global_step
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        elapsed = time.time() - self.start_time if self.start_time else 0
+        if elapsed > 0 and state.global_step > self.start_step:
+            rate = (state.global_step - self.start_step) * self.samples_per_step / elapsed
+            logging.info(f"Rank {args.process_index}: {rate:.1f} train samples/sec")
+
+def evaluate_model(model, dataset: Dataset, collator, batch_size: int, bf16: bool = False) -> Dict[str, Any]:
+    """Span metrics of model on an encoded dataset, batch by batch."""
+    columns = [column for column in dataset.column_names if column != 'length']
+    predictions, labels = [], []
+    with torch.no_grad(), autocast(bf16):
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset[start:start + batch_size]
+            batch = collator([
+                {column: rows[column][i] for column in columns}
+                for i in range(len(rows['input_ids']))
+            ])
+            batch_labels = batch.pop('labels')
+            predictions.append(model(**batch).logits.argmax(dim=-1).numpy())
+            labels.append(batch_labels.numpy())
+
+    # Batches are padded to different widths
+    width = max(batch.shape[1] for batch in predictions)
+    def pad(batch: np.ndarray, value: int) -> np.ndarray:
+        return np.pad(batch, ((0, 0), (0, width - batch.shape[1])), constant_values=value)
+    return span_metrics(
+        np.concatenate([pad(batch, 0) for batch in predictions]),
+        np.concatenate([pad(batch, -100) for batch in labels]),
+        model.config.id2label
+    )
+
+def evaluate_snapshot(snapshot_dir: str, tokenizer_dir: str, dataset_dir: str,
+                      batch_size: int, num_threads: int, step: int) -> Dict[str, Any]:
+    """Evaluate a saved model snapshot; runs in AsyncEvalCallback's worker process."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model = AutoModelForTokenClassification.from_pretrained(snapshot_dir)
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+    collator = DataCollatorForTokenClassification(tokenizer, pad_to_multiple_of=8)
+    metrics = evaluate_model(model, load_from_disk(dataset_dir), collator, batch_size)
+    return {'step': step, 'snapshot': snapshot_dir, 'metrics': metrics}
+
+class AsyncEvalCallback(TrainerCallback):
+    """Evaluate snapshots in a background process while training continues.
+
+    Every eval_steps the model is saved and handed to a single worker
+    process. Finished results are picked up at later steps: they are added
+    to the log history, drive best-model selection (only the best snapshot
+    is kept and loaded back at the end of training) and, with
+    early_stopping_patience, stop training after that many evaluations
+    without improvement.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        eval_dataset: Union[Dataset, IterableDataset],
+        output_dir: str,
+        eval_steps: int,
+        batch_size: int,
+        num_threads: int = None,
+        early_stopping_patience: int = None,
+        metric: str = "f1"
+    ):
+        self.eval_dir = os.path.join(output_dir, "async-eval")
+        self.tokenizer_dir = os.path.join(self.eval_dir, "tokenizer")
+        self.dataset_dir = os.path.join(self.eval_dir, "eval-dataset")
+        shutil.rmtree(self.eval_dir, ignore_errors=True)
+        os.makedirs(self.eval_dir)
+        tokenizer.save_pretrained(self.tokenizer_dir)
+        if isinstance(eval_dataset, IterableDataset):
+            eval_dataset = Dataset.from_list(list(eval_dataset))
+        eval_dataset.save_to_disk(self.dataset_dir)
+
+        self.eval_steps = eval_steps
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.early_stopping_patience = early_stopping_patience
+        self.metric = metric
+        self.executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.pending = []
+        self.best_metric = None
+        self.best_snapshot = None
+        self.evals_without_improvement = 0
+
+    def on_step_end(self, args, state, control, model=None, **kwargs):
+        self._collect(state, control, wait=False)
+        if state.global_step % self.eval_steps == 0:
+            snapshot = os.path.join(self.eval_dir, f"step-{state.global_step}")
+            model.save_pretrained(snapshot)
+            self.pending.append(self.executor.submit(
+                evaluate_snapshot, snapshot, self.tokenizer_dir, self.dataset_dir,
+                self.batch_size, self.num_threads, state.global_step
+            ))
+
+    def on_train_end(self, args, state, control, model=None, **kwargs):
+        self._collect(state, control, wait=True)
+        self.executor.shutdown()
+        if self.best_snapshot:
+            logging.info(f"Loading best async-evaluated model from {self.best_snapshot} "
+                         f"({self.metric}={self.best_metric:.4f})")
+            best = AutoModelForTokenClassification.from_pretrained(self.best_snapshot)
+            model.load_state_dict(best.state_dict())
+
+    def _collect(self, state, control, wait: bool):
+        """Apply finished evaluations (all pending ones when wait is set)."""
+        while self.pending and (wait or self.pending[0].done()):
+            result = self.pending.pop(0).result()
+            metrics = result['metrics']
+            value = metrics[self.metric]
+            state.log_history.append({
+                'step': result['step'],
+                **{f"eval_{key}": val for key, val in metrics.items() if key != 'per_entity'}
+            })
+            logging.info(f"Async evaluation at step {result['step']}: {self.metric}={value:.4f}")
+
+            if self.best_metric is None or value > self.best_metric:
+                if self.best_snapshot:
+                    shutil.rmtree(self.best_snapshot, ignore_errors=True)
+                self.best_metric = value
+                self.best_snapshot = result['snapshot']
+                self.evals_without_improvement = 0
+            else:
+                shutil.rmtree(result['snapshot'], ignore_errors=True)
+                self.evals_without_improvement += 1
+
+            if (self.early_stopping_patience
+                    and self.evals_without_improvement >= self.early_stopping_patience):
+                logging.info("Early stopping: no improvement in "
+                             f"{self.evals_without_improvement} async evaluations")
+                control.should_training_stop = True
+
 def train(
     output_dir: str = "../hebrew-medical-ner",
     num_train_epochs: int = 5,
@@ -164,14 +670,56 @@ def train(
     save_steps: int = 1000,
     eval_steps: int = 1000,
     min_examples: int = 1000, #5000
-    max_examples: int = 1000
-) -> None:
-    """Train the NER model."""
+    max_examples: int = 1000,
+    seed: int = 42,
+    max_length: int = 256,
+    cache_dir: str = "../cache",
+    streaming: bool = False,
+    shuffle_buffer: int = 10000,
+    eval_examples: int = 1000,
+    packing: bool = False,
+    eval_accumulation_steps: int = 16,
+    ddp: bool = False,
+    threads_per_rank: int = None,
+    global_batch_size: int = None,
+    async_eval: bool = False,
+    eval_threads: int = None,
+    early_stopping_patience: int = None,
+    callbacks: List[TrainerCallback] = None,
+    bf16: bool = False,
+    torch_compile: bool = False
+) -> Dict[str, Any]:
+    """Train the NER model.
+
+    With streaming=True, training examples are generated and tokenized on
+    the fly and the run lasts num_train_epochs * min_examples examples.
+    With packing=True, short training examples are packed into rows of up
+    to max_length tokens; evaluation stays unpacked. Evaluation logits are
+    reduced to label ids per batch and moved off the model every
+    eval_accumulation_steps batches.
+
+    With ddp=True the function is expected to run under torchrun and trains
+    data-parallel on CPU over gloo. global_batch_size fixes the effective
+    batch size through gradient accumulation, whatever the number of ranks.
+
+    With async_eval=True, periodic evaluation runs in a background process
+    on eval_threads cores (see AsyncEvalCallback) instead of pausing
+    training. early_stopping_patience applies in both evaluation modes.
+    bf16=True trains under bf16 autocast and torch_compile=True compiles
+    the model graph; either falls back to fp32 eager when the machine does
+    not support it. Extra Trainer callbacks can be passed in callbacks.
+    Returns the final evaluation results.
+    """
     # Setup logging
     setup_logging(output_dir)
     logging.info(f"Starting training with output_dir: {output_dir}")
     
     try:
+        if packing and streaming:
+            raise ValueError("packing is only supported for non-streaming training")
+        if async_eval and ddp:
+            raise ValueError("async_eval is only supported for single-process training")
+
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
@@ -180,61 +728,131 @@ def train(
         id2label = get_labels(params_df)
         label2id = {v: k for k, v in id2label.items()}
         
+        # Per-rank CPU threads and gradient accumulation for a fixed global batch
+        world_size = int(os.environ.get("WORLD_SIZE", 1))
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", 1))
+        if ddp and threads_per_rank is None:
+            threads_per_rank = max(1, (os.cpu_count() or 1) // local_world_size)
+        if threads_per_rank:
+            torch.set_num_threads(threads_per_rank)
+        
+        gradient_accumulation_steps = 1
+        if global_batch_size:
+            gradient_accumulation_steps = max(1, global_batch_size // (batch_size * world_size))
+            effective_batch_size = batch_size * world_size * gradient_accumulation_steps
+            if effective_batch_size != global_batch_size:
+                logging.warning(f"Global batch size {global_batch_size} is not divisible by "
+                                f"batch_size * world_size; using {effective_batch_size}")
+        logging.info(f"World size: {world_size}, threads per rank: {torch.get_num_threads()}, "
+                     f"gradient accumulation steps: {gradient_accumulation_steps}")
+        bf16, torch_compile = resolve_acceleration(bf16, torch_compile)
+        logging.info(f"bf16 autocast: {bf16}, torch.compile: {torch_compile}")
+        
         # Initialize tokenizer and model
-        tokenizer = AutoTokenizer.from_pretrained("onlplab/alephbert-base")
+        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
         model = AutoModelForTokenClassification.from_pretrained(
-            "onlplab/alephbert-base",
+            BASE_MODEL,
             num_labels=len(id2label),
             id2label=id2label,
             label2id=label2id
         )
         
-        # Generate and encode dataset
-        logging.info("Generating training examples...")
-        examples = create_training_examples(min_examples=min_examples)[:max_examples]
-        
-        logging.info("Encoding dataset...")
-        dataset = encode_dataset(examples, tokenizer, label2id)
-        
-        # Split dataset
-        dataset = dataset.train_test_split(test_size=0.2)
-        logging.info(f"Train size: {len(dataset['train'])}, Test size: {len(dataset['test'])}")
+        # An unbounded stream has no length, so a streaming run is sized in steps
+        max_steps = -1
+        if streaming:
+            max_steps = math.ceil(num_train_epochs * min_examples /
+                                  (batch_size * gradient_accumulation_steps * world_size))
         
         # Training arguments
         training_args = TrainingArguments(
             output_dir=output_dir,
             num_train_epochs=num_train_epochs,
+            max_steps=max_steps,
             per_device_train_batch_size=batch_size,
             per_device_eval_batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps,
             learning_rate=learning_rate,
             weight_decay=weight_decay,
             warmup_ratio=warmup_ratio,
-            evaluation_strategy="steps",
+            evaluation_strategy="no" if async_eval else "steps",
             save_strategy="steps",
             save_steps=save_steps,
             eval_steps=eval_steps,
-            load_best_model_at_end=True,
+            load_best_model_at_end=not async_eval,
             metric_for_best_model="f1",
             greater_is_better=True,
             save_total_limit=2,
+            eval_accumulation_steps=eval_accumulation_steps,
             logging_dir=os.path.join(output_dir, "logs"),
             logging_steps=100,
             report_to=["none"],
-            fp16=False
+            group_by_length=not streaming,
+            length_column_name="length",
+            ddp_backend="gloo" if ddp else None,
+            # bf16 on CPU goes through CPU autocast, which needs use_cpu
+            use_cpu=ddp or (bf16 and not torch.cuda.is_available()),
+            fp16=False,
+            bf16=bf16,
+            torch_compile=torch_compile
         )
         
+        # Rank 0 builds (and caches) the datasets first; other ranks then reuse them
+        with training_args.main_process_first(desc="dataset preparation"):
+            if streaming:
+                train_dataset, eval_dataset = prepare_streaming_datasets(
+                    tokenizer,
+                    label2id,
+                    seed=seed,
+                    eval_examples=eval_examples,
+                    max_length=max_length,
+                    shuffle_buffer=shuffle_buffer
+                )
+                logging.info(f"Streaming training for {max_steps} steps, Test size: {eval_examples}")
+            else:
+                # Generate, encode and split dataset (cached by inputs)
+                dataset = prepare_datasets(
+                    tokenizer,
+                    label2id,
+                    seed=seed,
+                    min_examples=min_examples,
+                    max_examples=max_examples,
+                    max_length=max_length,
+                    cache_dir=cache_dir
+                )
+                train_dataset, eval_dataset = dataset['train'], dataset['test']
+                logging.info(f"Train size: {len(train_dataset)}, Test size: {len(eval_dataset)}")
+                if packing:
+                    train_dataset = pack_dataset(train_dataset, max_length=max_length)
+                    logging.info(f"Packed training set into {len(train_dataset)} rows")
+        
+        callbacks = list(callbacks or []) + [ThroughputCallback(batch_size * gradient_accumulation_steps)]
+        if async_eval:
+            callbacks.append(AsyncEvalCallback(
+                tokenizer,
+                eval_dataset,
+                output_dir,
+                eval_steps=eval_steps,
+                batch_size=batch_size,
+                num_threads=eval_threads,
+                early_stopping_patience=early_stopping_patience
+            ))
+        elif early_stopping_patience:
+            callbacks.append(EarlyStoppingCallback(early_stopping_patience=early_stopping_patience))
+        
         # Initialize trainer
         trainer = Trainer(
             model=model,
             args=training_args,
-            train_dataset=dataset['train'],
-            eval_dataset=dataset['test'],
+            train_dataset=train_dataset,
+            eval_dataset=eval_dataset,
             tokenizer=tokenizer,
             compute_metrics=compute_metrics(id2label, label2id),
-            data_collator=DataCollatorForTokenClassification(
-                tokenizer,
-                pad_to_multiple_of=8
-            )
+            preprocess_logits_for_metrics=argmax_logits,
+            data_collator=(
+                PackedDataCollator(tokenizer, pad_to_multiple_of=8, dtype=model.dtype) if packing
+                else DataCollatorForTokenClassification(tokenizer, pad_to_multiple_of=8)
+            ),
+            callbacks=callbacks
         )
         
         # Train model
@@ -245,6 +863,9 @@ def train(
         logging.info("Performing final evaluation...")
         eval_results = trainer.evaluate()
         
+        if not trainer.is_world_process_zero():
+            return eval_results
+        
         # Save final model and tokenizer
         final_output_dir = os.path.join(output_dir, "final")
         os.makedirs(final_output_dir, exist_ok=True)
@@ -257,14 +878,22 @@ def train(
             'id2label': id2label,
             'label2id': label2id,
             'model_name': "hebrew-medical-ner",
-            'base_model': "onlplab/alephbert-base",
+            'base_model': BASE_MODEL,
             'training_params': {
                 'epochs': num_train_epochs,
                 'batch_size': batch_size,
                 'learning_rate': learning_rate,
                 'weight_decay': weight_decay,
                 'warmup_ratio': warmup_ratio,
-                'min_examples': min_examples
+                'min_examples': min_examples,
+                'seed': seed,
+                'max_length': max_length,
+                'streaming': streaming,
+                'packing': packing,
+                'world_size': world_size,
+                'gradient_accumulation_steps': gradient_accumulation_steps,
+                'bf16': bf16,
+                'torch_compile': torch_compile
             },
             'eval_results': eval_results
         }
@@ -274,36 +903,554 @@ def train(
         
         logging.info(f"Training complete! Model saved to {final_output_dir}")
         logging.info(f"Final evaluation results: {eval_results}")
+        return eval_results
         
     except Exception as e:
         logging.error(f"Error during training: {e}", exc_info=True)
         raise
 
+def evaluation_training_args(output_dir: str, num_train_epochs: int, batch_size: int,
+                             learning_rate: float, eval_steps: int) -> TrainingArguments:
+    """TrainingArguments for the secondary modes (distillation, fine-tuning).
+
+    Evaluates and checkpoints every eval_steps and keeps the best model by F1.
+    """
+    return TrainingArguments(
+        output_dir=output_dir,
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=batch_size,
+        per_device_eval_batch_size=batch_size,
+        learning_rate=learning_rate,
+        warmup_ratio=0.1,
+        evaluation_strategy="steps",
+        save_strategy="steps",
+        save_steps=eval_steps,
+        eval_steps=eval_steps,
+        load_best_model_at_end=True,
+        metric_for_best_model="f1",
+        greater_is_better=True,
+        save_total_limit=2,
+        logging_dir=os.path.join(output_dir, "logs"),
+        logging_steps=100,
+        report_to=["none"],
+        group_by_length=True,
+        length_column_name="length"
+    )
+
+class DistillationTrainer(Trainer):
+    """Trainer that fits a student to a teacher's soft token-label distributions.
+
+    The loss mixes cross-entropy on the gold labels (weight alpha) with the
+    temperature-scaled KL divergence to the teacher, over labelled tokens.
+    """
+
+    def __init__(self, *args, teacher_model=None, temperature: float = 2.0, alpha: float = 0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher_model = teacher_model.to(self.args.device).eval()
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        outputs = model(**inputs)
+        teacher_inputs = {k: v for k, v in inputs.items() if k != 'labels'}
+        with torch.no_grad():
+            teacher_logits = self.teacher_model(**teacher_inputs).logits
+
+        mask = inputs['labels'] != -100
+        student_log_probs = torch.log_softmax(outputs.logits[mask] / self.temperature, dim=-1)
+        teacher_probs = torch.softmax(teacher_logits[mask] / self.temperature, dim=-1)
+        distill_loss = torch.nn.functional.kl_div(
+            student_log_probs, teacher_probs, reduction="batchmean"
+        ) * self.temperature ** 2
+
+        loss = self.alpha * outputs.loss + (1 - self.alpha) * distill_loss
+        return (loss, outputs) if return_outputs else loss
+
+def student_from_teacher(teacher, num_layers: int, hidden_size: int = None):
+    """Build a smaller student with the teacher's vocabulary and label map.
+
+    When the hidden size is unchanged, embeddings, classifier and an evenly
+    spaced subset of the teacher's encoder layers initialize the student.
+    """
+    config = copy.deepcopy(teacher.config)
+    config.num_hidden_layers = num_layers
+    if hidden_size and hidden_size != config.hidden_size:
+        config.hidden_size = hidden_size
+        config.num_attention_heads = max(1, hidden_size // 64)
+        config.intermediate_size = 4 * hidden_size
+    student = AutoModelForTokenClassification.from_config(config)
+
+    if config.hidden_size == teacher.config.hidden_size:
+        teacher_layers = teacher.config.num_hidden_layers
+        layer_map = {
+            i: round(i * (teacher_layers - 1) / max(1, num_layers - 1)) for i in range(num_layers)
+        }
+        teacher_state = teacher.state_dict()
+        state = {}
+        for key in student.state_dict():
+            match = re.search(r'\.layer\.(\d+)\.', key)
+            teacher_key = key
+            if match:
+                teacher_key = key.replace(match.group(0), f".layer.{layer_map[int(match.group(1))]}.", 1)
+            state[key] = teacher_state[teacher_key]
+        student.load_state_dict(state)
+    return student
+
+def measure_latency(model, dataset: Dataset, collator, num_samples: int = 100,
+                    bf16: bool = False) -> float:
+    """Median single-document CPU forward latency in milliseconds."""
+    model.eval()
+    columns = [column for column in dataset.column_names if column not in ('labels', 'length')]
+    rows = [dataset[i] for i in range(min(num_samples, len(dataset)))]
+    timings = []
+    with torch.no_grad(), autocast(bf16):
+        for i, row in enumerate(rows[:3] + rows):  # first three are warm-up
+            batch = collator([{column: row[column] for column in columns}])
+            batch = {key: value.to(model.device) for key, value in batch.items()}
+            start = time.perf_counter()
+            model(**batch)
+            if i >= 3:
+                timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+def distill(
+    teacher_dir: str = "../hebrew-medical-ner/final",
+    output_dir: str = "../hebrew-medical-ner-student",
+    student_layers: int = 4,
+    student_hidden: int = None,
+    temperature: float = 2.0,
+    alpha: float = 0.5,
+    num_train_epochs: int = 5,
+    batch_size: int = 16,
+    learning_rate: float = 1e-4,
+    eval_steps: int = 1000,
+    min_examples: int = 5000,
+    max_examples: int = 5000,
+    seed: int = 42,
+    max_length: int = 256,
+    cache_dir: str = "../cache"
+) -> Dict[str, Any]:
+    """Distill the trained NER model into a smaller, faster student.
+
+    Writes the student to output_dir/final together with
+    distillation_report.json comparing teacher and student per-entity F1
+    and single-document CPU latency.
+    """
+    setup_logging(output_dir)
+    logging.info(f"Distilling {teacher_dir} into a {student_layers}-layer student")
+
+    tokenizer = AutoTokenizer.from_pretrained(teacher_dir)
+    teacher = AutoModelForTokenClassification.from_pretrained(teacher_dir)
+    student = student_from_teacher(teacher, student_layers, student_hidden)
+    id2label = teacher.config.id2label
+    label2id = teacher.config.label2id
+
+    dataset = prepare_datasets(
+        tokenizer,
+        label2id,
+        seed=seed,
+        min_examples=min_examples,
+        max_examples=max_examples,
+        max_length=max_length,
+        cache_dir=cache_dir
+    )
+    collator = DataCollatorForTokenClassification(tokenizer, pad_to_multiple_of=8)
+
+    training_args = evaluation_training_args(
+        output_dir, num_train_epochs, batch_size, learning_rate, eval_steps
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=dataset['train'],
+        eval_dataset=dataset['test'],
+        tokenizer=tokenizer,
+        compute_metrics=compute_metrics(id2label, label2id),
+        preprocess_logits_for_metrics=argmax_logits,
+        data_collator=collator,
+        teacher_model=teacher,
+        temperature=temperature,
+        alpha=alpha
+    )
+    trainer.train()
+
+    # Compare student and teacher on the same eval split
+    student_results = trainer.evaluate()
+    teacher_results = Trainer(
+        model=teacher,
+        args=training_args,
+        eval_dataset=dataset['test'],
+        compute_metrics=compute_metrics(id2label, label2id),
+        preprocess_logits_for_metrics=argmax_logits,
+        data_collator=collator
+    ).evaluate()
+
+    def summary(model, results: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'f1': results.get('eval_f1'),
+            'per_entity_f1': {
+                entity: scores['f1'] for entity, scores in results.get('eval_per_entity', {}).items()
+            },
+            'latency_ms': measure_latency(model, dataset['test'], collator),
+            'parameters': sum(p.numel() for p in model.parameters())
+        }
+
+    report = {'teacher': summary(teacher, teacher_results), 'student': summary(student, student_results)}
+    report['speedup'] = report['teacher']['latency_ms'] / report['student']['latency_ms']
+    report['f1_delta'] = (report['student']['f1'] or 0) - (report['teacher']['f1'] or 0)
+
+    final_output_dir = os.path.join(output_dir, "final")
+    os.makedirs(final_output_dir, exist_ok=True)
+    student.save_pretrained(final_output_dir)
+    tokenizer.save_pretrained(final_output_dir)
+    with open(os.path.join(final_output_dir, "distillation_report.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    logging.info(f"Student F1 {report['student']['f1']:.4f} vs teacher {report['teacher']['f1']:.4f}, "
+                 f"latency {report['student']['latency_ms']:.1f}ms vs "
+                 f"{report['teacher']['latency_ms']:.1f}ms ({report['speedup']:.1f}x faster)")
+    return report
+
+def extend_label_map(id2label: Dict[int, str], params_df) -> Dict[int, str]:
+    """Append B-/I- labels for fields not yet in id2label, keeping existing ids."""
+    extended = dict(id2label)
+    known = set(extended.values())
+    next_id = max(extended) + 1
+    for label in get_labels(params_df).values():
+        if label not in known:
+            extended[next_id] = label
+            next_id += 1
+    return extended
+
+def extend_classifier(model, id2label: Dict[int, str]):
+    """Grow the token-classification head to cover id2label.
+
+    Rows of existing labels are copied; only the new rows are initialized.
+    """
+    old = model.classifier
+    num_labels = len(id2label)
+    if num_labels > old.out_features:
+        classifier = torch.nn.Linear(old.in_features, num_labels)
+        classifier.weight.data.normal_(mean=0.0, std=model.config.initializer_range)
+        classifier.bias.data.zero_()
+        classifier.weight.data[:old.out_features] = old.weight.data
+        classifier.bias.data[:old.out_features] = old.bias.data
+        model.classifier = classifier
+    model.num_labels = num_labels
+    model.config.num_labels = num_labels
+    model.config.id2label = id2label
+    model.config.label2id = {label: i for i, label in id2label.items()}
+    return model
+
+def fine_tune(
+    base_model_dir: str = "../hebrew-medical-ner/final",
+    new_data: str = None,
+    output_dir: str = "../hebrew-medical-ner-incremental",
+    replay_ratio: float = 1.0,
+    num_train_epochs: int = 2,
+    batch_size: int = 16,
+    learning_rate: float = 2e-5,
+    eval_steps: int = 200,
+    seed: int = 42,
+    max_length: int = 256
+) -> Dict[str, Any]:
+    """Warm-start from a trained model and fine-tune on new labelled examples.
+
+    Labels for fields added to transformed_parameters.csv are appended to
+    the model's label map (new classifier rows only). Training mixes the
+    examples in new_data (JSONL rows with "tokens" and "labels") with a
+    replay sample of replay_ratio times as many generated examples, so
+    previously learned fields are not forgotten.
+    """
+    setup_logging(output_dir)
+    logging.info(f"Fine-tuning {base_model_dir} on {new_data}")
+
+    tokenizer = AutoTokenizer.from_pretrained(base_model_dir)
+    model = AutoModelForTokenClassification.from_pretrained(base_model_dir)
+    old_num_labels = model.config.num_labels
+    id2label = extend_label_map(model.config.id2label, load_parameters())
+    model = extend_classifier(model, id2label)
+    label2id = model.config.label2id
+    logging.info(f"Label map: {old_num_labels} -> {len(id2label)} labels")
+
+    new_examples = read_examples(new_data) if new_data else []
+    replay_count = int(len(new_examples) * replay_ratio) if new_examples else 1000
+    replay_examples = list(iter_training_examples(replay_count, seed=seed))
+    logging.info(f"New examples: {len(new_examples)}, replay examples: {len(replay_examples)}")
+
+    dataset = encode_dataset(new_examples + replay_examples, tokenizer, label2id, max_length=max_length)
+    dataset = dataset.train_test_split(test_size=0.2, seed=seed)
+
+    trainer = Trainer(
+        model=model,
+        args=evaluation_training_args(output_dir, num_train_epochs, batch_size, learning_rate, eval_steps),
+        train_dataset=dataset['train'],
+        eval_dataset=dataset['test'],
+        tokenizer=tokenizer,
+        compute_metrics=compute_metrics(id2label, label2id),
+        preprocess_logits_for_metrics=argmax_logits,
+        data_collator=DataCollatorForTokenClassification(tokenizer, pad_to_multiple_of=8)
+    )
+    trainer.train()
+    eval_results = trainer.evaluate()
+
+    final_output_dir = os.path.join(output_dir, "final")
+    os.makedirs(final_output_dir, exist_ok=True)
+    model.save_pretrained(final_output_dir)
+    tokenizer.save_pretrained(final_output_dir)
+
+    config = {
+        'id2label': id2label,
+        'label2id': label2id,
+        'model_name': "hebrew-medical-ner",
+        'base_model': base_model_dir,
+        'training_params': {
+            'epochs': num_train_epochs,
+            'batch_size': batch_size,
+            'learning_rate': learning_rate,
+            'new_data': new_data,
+            'new_examples': len(new_examples),
+            'replay_examples': len(replay_examples),
+            'seed': seed
+        },
+        'eval_results': eval_results
+    }
+    with open(os.path.join(final_output_dir, "training_config.json"), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    logging.info(f"Fine-tuning complete! Model saved to {final_output_dir}")
+    return eval_results
+
+def measure_step_time(model, dataset: Dataset, collator, batch_size: int = 16,
+                      num_steps: int = 20, bf16: bool = False) -> float:
+    """Median training step (forward, backward, AdamW update) time in milliseconds.
+
+    Trains model in place; pass a copy.
+    """
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=5e-5)
+    columns = [column for column in dataset.column_names if column != 'length']
+    timings = []
+    for step in range(num_steps + 3):  # first three are warm-up
+        start_row = (step * batch_size) % max(1, len(dataset) - batch_size)
+        rows = dataset[start_row:start_row + batch_size]
+        batch = collator([
+            {column: rows[column][i] for column in columns}
+            for i in range(len(rows['input_ids']))
+        ])
+        start = time.perf_counter()
+        with autocast(bf16):
+            loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        if step >= 3:
+            timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+def benchmark(
+    model_dir: str,
+    batch_size: int = 16,
+    num_steps: int = 20,
+    num_samples: int = 100,
+    eval_examples: int = 500,
+    seed: int = 42,
+    cache_dir: str = "../cache"
+) -> Dict[str, Any]:
+    """Compare bf16 autocast and torch.compile against fp32 eager for a trained model.
+
+    For each mode reports the median training step time, the median
+    single-document inference latency and the F1 on generated evaluation
+    data, with deltas against fp32 eager. Modes the machine cannot run are
+    reported as skipped. Writes benchmark_report.json to model_dir.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    label2id = transformers.AutoConfig.from_pretrained(model_dir).label2id
+    dataset = prepare_datasets(
+        tokenizer,
+        label2id,
+        seed=seed,
+        min_examples=eval_examples * 5,
+        max_examples=eval_examples * 5,
+        cache_dir=cache_dir
+    )['test']
+    collator = DataCollatorForTokenClassification(tokenizer, pad_to_multiple_of=8)
+
+    modes = {
+        'fp32': (False, False),
+        'bf16': (True, False),
+        'compile': (False, True),
+        'bf16+compile': (True, True)
+    }
+    report = {'model_dir': model_dir, 'threads': torch.get_num_threads(), 'modes': {}}
+    for name, requested in modes.items():
+        if resolve_acceleration(*requested) != requested:
+            report['modes'][name] = {'skipped': True}
+            continue
+        bf16, compile = requested
+        logging.info(f"Benchmarking {name}...")
+
+        model = AutoModelForTokenClassification.from_pretrained(model_dir)
+        if compile:
+            model = torch.compile(model, dynamic=True)
+        step_time = measure_step_time(model, dataset, collator, batch_size, num_steps, bf16)
+
+        model, bf16 = prepare_inference_model(
+            AutoModelForTokenClassification.from_pretrained(model_dir), bf16, compile
+        )
+        latency = measure_latency(model, dataset, collator, num_samples, bf16)
+        f1 = evaluate_model(model, dataset, collator, batch_size, bf16)['f1']
+        report['modes'][name] = {'step_time_ms': step_time, 'latency_ms': latency, 'f1': f1}
+
+    baseline = report['modes']['fp32']
+    for result in report['modes'].values():
+        if not result.get('skipped'):
+            result['step_speedup'] = baseline['step_time_ms'] / result['step_time_ms']
+            result['latency_speedup'] = baseline['latency_ms'] / result['latency_ms']
+            result['f1_delta'] = result['f1'] - baseline['f1']
+
+    with open(os.path.join(model_dir, "benchmark_report.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'Mode':<14} {'Step ms':<10} {'Latency ms':<12} {'F1':<8} {'F1 delta':<10}")
+    print("-" * 56)
+    for name, result in report['modes'].items():
+        if result.get('skipped'):
+            print(f"{name:<14} skipped (not supported)")
+        else:
+            print(f"{name:<14} {result['step_time_ms']:<10.1f} {result['latency_ms']:<12.2f} "
+                  f"{result['f1']:<8.4f} {result['f1_delta']:<+10.4f}")
+    return report
+
 def main():
     """Main function to run the training pipeline."""
     import argparse
     
     parser = argparse.ArgumentParser(description='Train Hebrew Medical NER model')
-    parser.add_argument('--output_dir', default='../hebrew-medical-ner', 
-                       help='Output directory for model')
-    parser.add_argument('--epochs', type=int, default=5, 
-                       help='Number of training epochs')
+    parser.add_argument('--output_dir', default=None, 
+                       help='Output directory for model (default: ../hebrew-medical-ner, '
+                            '../hebrew-medical-ner-student with --distill_from, '
+                            '../hebrew-medical-ner-incremental with --warm_start)')
+    parser.add_argument('--epochs', type=int, default=None, 
+                       help='Number of training epochs (default: 5, 2 with --warm_start)')
     parser.add_argument('--batch_size', type=int, default=16, 
                        help='Batch size')
-    parser.add_argument('--learning_rate', type=float, default=5e-5, 
-                       help='Learning rate')
+    parser.add_argument('--learning_rate', type=float, default=None, 
+                       help='Learning rate (default: 5e-5, 1e-4 with --distill_from, '
+                            '2e-5 with --warm_start)')
     parser.add_argument('--min_examples', type=int, default=5000, 
                        help='Minimum number of training examples')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Seed for training data generation and splitting')
+    parser.add_argument('--cache_dir', default='../cache',
+                       help='Directory for cached generated/encoded datasets')
+    parser.add_argument('--no_cache', action='store_true',
+                       help='Always regenerate and re-encode the dataset')
+    parser.add_argument('--streaming', action='store_true',
+                       help='Generate and tokenize training examples on the fly')
+    parser.add_argument('--shuffle_buffer', type=int, default=10000,
+                       help='Shuffle buffer size for streaming training')
+    parser.add_argument('--packing', action='store_true',
+                       help='Pack short training examples into full-length rows')
+    parser.add_argument('--ddp', action='store_true',
+                       help='CPU data-parallel training over gloo; launch with '
+                            'torchrun --nproc_per_node=N [--nnodes=M ...] trainer.py --ddp')
+    parser.add_argument('--threads_per_rank', type=int, default=None,
+                       help='Intra-op threads per rank (default: cores / local ranks with --ddp)')
+    parser.add_argument('--global_batch_size', type=int, default=None,
+                       help='Effective batch size kept fixed via gradient accumulation')
+    parser.add_argument('--async_eval', action='store_true',
+                       help='Evaluate checkpoints in a background process during training')
+    parser.add_argument('--eval_threads', type=int, default=None,
+                       help='CPU threads for the background evaluation process')
+    parser.add_argument('--early_stopping_patience', type=int, default=None,
+                       help='Stop after this many evaluations without F1 improvement')
+    parser.add_argument('--distill_from', default=None,
+                       help='Distill this trained model into a smaller student instead of training')
+    parser.add_argument('--student_layers', type=int, default=4,
+                       help='Encoder layers of the distilled student')
+    parser.add_argument('--student_hidden', type=int, default=None,
+                       help='Hidden size of the student (default: same as the teacher)')
+    parser.add_argument('--temperature', type=float, default=2.0,
+                       help='Distillation softmax temperature')
+    parser.add_argument('--alpha', type=float, default=0.5,
+                       help='Weight of the gold-label loss versus the distillation loss')
+    parser.add_argument('--warm_start', default=None,
+                       help='Fine-tune this trained model incrementally instead of training from scratch')
+    parser.add_argument('--new_data', default=None,
+                       help='JSONL file of new labelled examples ("tokens"/"labels") for --warm_start')
+    parser.add_argument('--replay_ratio', type=float, default=1.0,
+                       help='Generated replay examples per new example for --warm_start')
+    parser.add_argument('--bf16', action='store_true',
+                       help='Train under bf16 autocast (falls back to fp32 if unsupported)')
+    parser.add_argument('--torch_compile', action='store_true',
+                       help='Compile the model with torch.compile (falls back to eager if unavailable)')
+    parser.add_argument('--benchmark', default=None,
+                       help='Benchmark fp32/bf16/compiled step time, latency and F1 of this trained model')
     
     args = parser.parse_args()
+    # Only forward what was set, so every mode keeps its own defaults
+    training = {name: value for name, value in (('num_train_epochs', args.epochs),
+                                                ('learning_rate', args.learning_rate))
+                if value is not None}
     
     try:
+        if args.benchmark:
+            benchmark(
+                model_dir=args.benchmark,
+                batch_size=args.batch_size,
+                seed=args.seed,
+                cache_dir=None if args.no_cache else args.cache_dir
+            )
+            return
+        
+        if args.distill_from:
+            distill(
+                teacher_dir=args.distill_from,
+                output_dir=args.output_dir or '../hebrew-medical-ner-student',
+                student_layers=args.student_layers,
+                student_hidden=args.student_hidden,
+                temperature=args.temperature,
+                alpha=args.alpha,
+                batch_size=args.batch_size,
+                min_examples=args.min_examples,
+                max_examples=args.min_examples,
+                seed=args.seed,
+                cache_dir=None if args.no_cache else args.cache_dir,
+                **training
+            )
+            return
+        
+        if args.warm_start:
+            fine_tune(
+                base_model_dir=args.warm_start,
+                new_data=args.new_data,
+                output_dir=args.output_dir or '../hebrew-medical-ner-incremental',
+                replay_ratio=args.replay_ratio,
+                batch_size=args.batch_size,
+                seed=args.seed,
+                **training
+            )
+            return
+        
         train(
-            output_dir=args.output_dir,
-            num_train_epochs=args.epochs,
+            output_dir=args.output_dir or '../hebrew-medical-ner',
             batch_size=args.batch_size,
-            learning_rate=args.learning_rate,
-            min_examples=args.min_examples
+            min_examples=args.min_examples,
+            seed=args.seed,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            streaming=args.streaming,
+            shuffle_buffer=args.shuffle_buffer,
+            packing=args.packing,
+            ddp=args.ddp,
+            threads_per_rank=args.threads_per_rank,
+            global_batch_size=args.global_batch_size,
+            async_eval=args.async_eval,
+            eval_threads=args.eval_threads,
+            early_stopping_patience=args.early_stopping_patience,
+            bf16=args.bf16,
+            torch_compile=args.torch_compile,
+            **training
         )
     except Exception as e:
         logging.error(f"Training failed: {e}", exc_info=True)